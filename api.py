@@ -0,0 +1,77 @@
+import hashlib
+import json
+import os
+
+import flask
+
+#most keys (years, drivers) one request can ask for
+API_MAX_BATCH = int(os.environ.get('API_MAX_BATCH', 100))
+#seconds a client or reverse proxy may reuse a response without asking again; after that it revalidates with the etag
+API_MAX_AGE = int(os.environ.get('API_MAX_AGE', 300))
+#the /api/v<N> prefix; bump when the shape of a response changes
+API_VERSION = 1
+
+######################################################Requests##########################################################
+
+def batch(args, name, parse):
+    #?year=2019&year=2020 or ?year=2019,2020 -> [2019, 2020], in the order asked for and without repeats; empty
+    #values (?name=, ?year=2019,) are skipped
+    keys = []
+    for value in args.getlist(name):
+        for part in value.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            key = parse(part)
+            if key not in keys:
+                keys.append(key)
+    return keys
+
+def validator(etag):
+    #the tag in If-None-Match naming this response, if any. flask-compress sends "<etag>:gzip" (or :br, ...) with a
+    #compressed body, and clients send back what they were given
+    for tag in flask.request.if_none_match.as_set():
+        if tag == etag or tag.startswith(etag + ':'):
+            return tag
+    return None
+
+def json_response(body, etag):
+    response = flask.Response(json.dumps(body, separators=(',', ':'), ensure_ascii=False), mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = API_MAX_AGE
+    return response
+
+######################################################Flask#############################################################
+
+def register(server, resources, current):
+    #/api/v1/<resource>?<param>=a&<param>=b returns {"data_version": ..., "<resource>": {a: ..., b: ...}} as compact
+    #json. resources maps a resource name to (query param, parser of one value, function of (dataset, key) returning
+    #plain json values, or None for a key the dataset does not have, which is returned as null); current() returns the
+    #dataset being served, read once per request.
+    #the etag is strong and depends only on the dataset version and the keys asked for, so If-None-Match is answered
+    #with a 304 before anything is computed, and a reverse proxy can serve repeats for API_MAX_AGE seconds
+    @server.route(f'/api/v{API_VERSION}/<resource>')
+    def api(resource):
+        if resource not in resources:
+            flask.abort(404)
+        param, parse, value = resources[resource]
+        try:
+            keys = batch(flask.request.args, param, parse)
+        except ValueError:
+            flask.abort(400)
+        if not keys or len(keys) > API_MAX_BATCH:
+            flask.abort(400)
+        dataset = current()
+
+        key = '\n'.join([dataset.data_version, str(API_VERSION), resource] + [str(k) for k in keys])
+        etag = hashlib.sha1(key.encode()).hexdigest()[:20]
+        tag = validator(etag)
+        if tag:
+            response = flask.Response(status=304)
+            response.set_etag(tag)
+            response.cache_control.public = True
+            response.cache_control.max_age = API_MAX_AGE
+            return response
+
+        return json_response({'data_version': dataset.data_version, resource: {k: value(dataset, k) for k in keys}}, etag)
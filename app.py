@@ -1,61 +1,338 @@
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
-from dash.dependencies import Input, Output, State
+from dash import Patch
+from dash.dependencies import ClientsideFunction, Input, Output, State
 import numpy as np
 import pandas as pd
 import plotly.graph_objs as go
 import plotly.express as px
-import urllib.request, json 
+from plotly.subplots import make_subplots
+import os
 import re
+import sys
+import threading
+import time
+from collections import namedtuple
+
+import api
+import export
+import metrics
+import wiki
+from data import (CIRCUIT_STATS, RANGE_STATS, build_aggregates, build_circuit_matrix, build_lap_records, build_range_sums,
+                  format_lap_time, freeze, load_data, range_totals, read_manifest)
+from headtohead import HeadToHead
+from lapengine import LapEngine
+from memo import MEMO_DIR, CallbackMemo, warmup
+import racechart
+import search
+
+######################################################Indexes###########################################################
+
+def run_slices(keys):
+    #start/stop of every run of equal keys in an already sorted array
+    change = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+    starts = np.r_[0, change]
+    stops = np.r_[change, len(keys)]
+    return {k.item(): slice(start, stop) for k, start, stop in zip(keys[starts], starts, stops)}
+
+no_rows = np.empty(0, dtype=np.intp)
+
+#rows of one state (see AppState below); iloc returns new frames, never views a request could write through
+def year_rows(current, year):
+    return current.f1_data.iloc[current.year_index.get(year, slice(0, 0))]
+
+def gp_rows(current, year, gp):
+    return current.f1_data.iloc[current.circuit_index.get((year, gp), no_rows)]
+
+def driver_rows(current, name):
+    return current.f1_data.iloc[current.driver_index.get(name, no_rows)]
+
+######################################################Figures#############################################################
+
+#dark theme shared by every chart
+dark_layout = dict(plot_bgcolor='#242e3f', paper_bgcolor='#242e3f', font={'color': 'white', 'size': 15})
+
+team_colors = {'Alfa Romeo': '#910002',
+               'Ferrari': '#ff0000',
+               'AlphaTauri': '#2C4562',
+               'Haas F1 Team': '#FFFFFF',
+               'McLaren': '#ff9900',
+               'Mercedes': '#00D2BE',
+               'Racing Point': '#ff00ff',
+               'Red Bull': '#1401EE',
+               'Renault': 'yellow',
+               'Williams': '#015BFF',
+               'BMW Sauber': '#010076',
+               'Toro Rosso': '#2C4562',
+               'Toyota': '#d0003e',
+               'Honda': '#030001',
+               'Force India': '#ff00ff',
+               'Brawn': '#ffff00',
+               'Sauber': '#1401EE',
+               'Lotus F1': '#cccc00',
+               'Jordan': '#ffcc00',
+               'BAR': 'white',
+               'Benetton': '#003300',
+               'Super Aguri': '#cc0000',
+               'Marussia': '#800000',
+               'Manor Marussia': '#800000',
+               'MF1': '#ff3300',
+               'Minardi': '#333399',
+               'Arrows': '#3366cc',
+               'Prost': 'red',
+               'Caterham': '#669900',
+               'Lotus': '#cccc00',
+               'Virgin': '#ff6600',
+               'HRT': '#669999',
+               'Spyker': '#f5f5f0',
+               'Jaguar':'#669900'
+              }
+
+#year tab figures, sent once with the page; the plots callback only patches their traces and titles
+year_map_figure = go.Figure(
+    data=go.Choropleth(locationmode='country names', colorscale=[[0, 'red'], [1, 'red']], showscale=False),
+    layout=dict(geo=dict(projection=dict(type='equirectangular'),
+                         showland=True,
+                         landcolor='white',
+                         lakecolor='#242e3f',
+                         showocean=True,
+                         oceancolor='#242e3f',
+                         showframe=False),
+                margin=dict(l=0, r=0, b=20, t=50),
+                dragmode=False,
+                title=dict(x=.5),
+                **dark_layout))
+
+driver_standings_figure = go.Figure(
+    data=[go.Bar(marker_color='#ff0000'), go.Bar(marker_color='#2C4562')],
+    layout=dict(barmode='group',
+                xaxis_tickangle=-45,
+                xaxis_title="Driver Code",
+                yaxis_title="Points",
+                title={'text': "Driver Standings", 'x': 0.5},
+                **dark_layout))
+
+teams_standings_figure = go.Figure(
+    data=go.Bar(orientation='h'),
+    layout=dict(barmode='group',
+                xaxis_tickangle=-45,
+                xaxis_title="Points",
+                title={'text': "Team Standings", 'x': 0.5},
+                **dark_layout))
+
+#grand prix tab lap by lap figures, patched by the race_analysis callback
+race_positions_figure = go.Figure(
+    layout=dict(title={'x': 0.5}, xaxis_title='Lap', yaxis_title='Position', yaxis={'autorange': 'reversed', 'dtick': 1},
+                **dark_layout))
+race_gaps_figure = go.Figure(
+    layout=dict(title={'text': 'Gap to leader', 'x': 0.5}, xaxis_title='Lap', yaxis_title='Seconds',
+                yaxis={'autorange': 'reversed'}, **dark_layout))
+race_lap_times_figure = go.Figure(
+    layout=dict(title={'text': 'Lap times', 'x': 0.5}, yaxis_title='Seconds', xaxis_tickangle=-45, **dark_layout))
+
+#seasons range tab figures, patched by the range_plots callback
+range_drivers_figure = go.Figure(
+    data=go.Bar(orientation='h', marker_color='#ff0000'),
+    layout=dict(yaxis={'autorange': 'reversed'}, margin=dict(l=180), title={'x': 0.5}, **dark_layout))
+range_teams_figure = go.Figure(
+    data=go.Bar(orientation='h'),
+    layout=dict(yaxis={'autorange': 'reversed'}, margin=dict(l=180), title={'x': 0.5}, **dark_layout))
+
+#grand prix history: axis title and the factor from the stored unit (ms, ratio) to the shown one (s, %)
+circuit_stat_labels = {
+    'fastest_lap_ms': ('Fastest lap (s)', 0.001),
+    'best_speed': ('Best lap speed (km/h)', 1),
+    'finisher_ratio': ('Classified finishers (%)', 100),
+    'accident_rate': ('Accidents (% of starters)', 100),
+}
+
+#one line per stat for the selected grand prix and a grand prix x year heatmap of one stat, patched by the
+#circuit_trends and circuit_heatmap callbacks
+circuit_trends_figure = make_subplots(rows=2, cols=2, shared_xaxes=True, vertical_spacing=0.12,
+                                      subplot_titles=[circuit_stat_labels[stat][0] for stat in CIRCUIT_STATS])
+for i, stat in enumerate(CIRCUIT_STATS):
+    circuit_trends_figure.add_trace(go.Scatter(mode='lines+markers', name=circuit_stat_labels[stat][0], marker_color='#ff0000'),
+                                    row=i // 2 + 1, col=i % 2 + 1)
+circuit_trends_figure.update_layout(showlegend=False, height=600, title={'x': 0.5}, **dark_layout)
+
+circuit_heatmap_figure = go.Figure(
+    data=go.Heatmap(colorscale='Inferno', hoverongaps=False,
+                    hovertemplate='%{y} %{x}: %{z}<extra></extra>'),
+    layout=dict(yaxis={'autorange': 'reversed', 'dtick': 1}, margin=dict(l=220), title={'x': 0.5}, **dark_layout))
 
 ######################################################Data##############################################################
 
-f1_data = pd.read_csv('F1_data.csv')
-f1_data = f1_data.sort_values(by='forename')
-laps = pd.read_csv('lap_times.csv')
-laps = pd.merge(laps,f1_data[['circuit','full_name','raceId','driverId','year','fastestLapSpeed','fastestLapTime']],on=['raceId','driverId'])
+#everything the callbacks read, built from one snapshot and read-only (see freeze in data.py). `state` is replaced as a
+#whole when a new snapshot is loaded; a callback reads it once into a local and uses only that, so a request never
+#mixes two datasets and request threads share it without locks
+AppState = namedtuple('AppState', [
+    'f1_data', 'laps', 'data_version', 'year_index', 'circuit_index', 'driver_index', 'aggregates',
+    'all_circuit_options', 'driver_options', 'driver_defaults', 'lap_records', 'range_sums', 'head_to_head_index',
+    'lap_engine', 'driver_search', 'race_charts', 'circuit_matrix',
+])
+
+def load_state(f1_data, laps, data_version, changed_years=None, previous=None):
+    #everything the callbacks read, built from one snapshot. with the state of the snapshot before (`previous`) only
+    #the seasons in `changed_years` are grouped and sorted again; what the other seasons give is carried over
+    full = previous is None or changed_years is None
+    #year -> slice
+    year_index = run_slices(f1_data['year'].values)
+    changed = set(year_index) if full else set(changed_years)
+
+    carried = touched = moved = changed_races = None
+    if not full:
+        carried = previous
+        #rows of the changed seasons in both snapshots: their drivers and races are the ones to look at again
+        old_rows = [previous.year_index[year] for year in changed if year in previous.year_index]
+        new_rows = [year_index[year] for year in changed if year in year_index]
+        seasons = [previous.f1_data.iloc[rows] for rows in old_rows] + [f1_data.iloc[rows] for rows in new_rows]
+        touched = set().union(*[season['full_name'].astype(str) for season in seasons])
+        changed_races = set().union(*[season['raceId'].tolist() for season in seasons])
+        #old row -> new row, for the seasons that did not change (their rows only move)
+        moved = np.full(len(previous.f1_data), -1)
+        for year, rows in previous.year_index.items():
+            if year not in changed:
+                moved[rows] = np.arange(year_index[year].start, year_index[year].stop)
+
+    #(year, grand prix) and driver -> row positions (a grand prix name can cover two races in one year, e.g. Bahrain 2020)
+    if full:
+        circuit_index = {(int(year), gp): rows for (year, gp), rows in f1_data.groupby(['year','circuit'], sort=False, observed=True).indices.items()}
+        driver_index = f1_data.groupby('full_name', sort=False, observed=True).indices
+    else:
+        circuit_index = {key: moved[rows] for key, rows in previous.circuit_index.items() if key[0] not in changed}
+        for year, rows in year_index.items():
+            if year in changed:
+                for gp, gp_rows in f1_data.iloc[rows].groupby('circuit', sort=False, observed=True).indices.items():
+                    circuit_index[(year, gp)] = gp_rows + rows.start
+        driver_index = {name: moved[rows] for name, rows in previous.driver_index.items() if name not in touched}
+        subset = np.flatnonzero(f1_data['full_name'].isin(list(touched)))
+        for name, rows in f1_data.iloc[subset].groupby('full_name', sort=False, observed=True).indices.items():
+            driver_index[name] = subset[rows]
+
+    #season standings/champions/accidents and driver careers, read by the callbacks instead of regrouping per request
+    aggregates = build_aggregates(f1_data, year_index, driver_index, changed_years, carried and carried.aggregates)
+
+    #circuits and drivers of every year (sent once with the page, see dropdown_options), and that year's champion,
+    #picked when the selected driver did not race in the new year
+    all_circuit_options = {year: list(f1_data.iloc[rows]['circuit'].unique()) if year in changed else previous.all_circuit_options[year]
+                           for year, rows in year_index.items()}
+    driver_options = {year: list(f1_data.iloc[rows].sort_values(by='forename', kind='mergesort')['full_name'].unique())
+                      if year in changed else previous.driver_options[year] for year, rows in year_index.items()}
+    driver_defaults = {year: aggregates['seasons'][year]['driver_champion'] for year in year_index}
+
+    derived = dict(
+        year_index=year_index,
+        circuit_index=circuit_index,
+        driver_index=driver_index,
+        aggregates=aggregates,
+        all_circuit_options=all_circuit_options,
+        driver_options=driver_options,
+        driver_defaults=driver_defaults,
+        #fastest laps ever per grand prix, for the historic record panel
+        lap_records=build_lap_records(laps, changed_years=changed_years, previous=carried and carried.lap_records),
+        #points/wins/podiums/accidents per driver and constructor summed up to every year, for the seasons range tab
+        range_sums=build_range_sums(f1_data, changed_years=changed_years, previous=carried and carried.range_sums),
+        #every driver's races as sorted raceIds, for head-to-head comparisons
+        head_to_head_index=HeadToHead(f1_data, driver_index, touched, carried and carried.head_to_head_index, moved),
+        #lap times as flat arrays per race, for the race analysis charts
+        lap_engine=LapEngine(laps, changed_races, carried and carried.lap_engine),
+        #typing in the driver dropdown searches every driver in history (/search/drivers, see search.py); a driver
+        #gone from the data would linger in the carried tables, so then it is built again
+        driver_search=search.DriverSearch(f1_data, touched, None if full or not touched <= set(driver_index) else previous.driver_search),
+        #cumulative race wins and points of drivers and constructors, one animation frame per race (cached per dataset
+        #version)
+        race_charts=racechart.race_charts(f1_data, data_version, team_colors, since=min(changed, default=max(year_index) + 1),
+                                          previous=carried and carried.race_charts),
+        #every grand prix in every year (pace, speed, finishers, accidents), for the history charts of the grand prix tab
+        circuit_matrix=build_circuit_matrix(f1_data, laps, changed_years, carried and carried.circuit_matrix),
+    )
+    return AppState(f1_data=f1_data, laps=laps, data_version=data_version, **{k: freeze(v) for k, v in derived.items()})
+
+#typed snapshot of the CSV files (rebuilt when they change, see data.py); reload_data swaps in the next snapshot
+#published by ingest.py
+state = load_state(*load_data())
 
 ######################################################Interactive Components############################################
 
-#years
-year_slider = dcc.Slider(
-        id='year_slider',
-        min=f1_data['year'].min(),
-        max=f1_data['year'].max(),
-        marks={str(i): '{}'.format(str(i)) for i in
-               [1950, 1960, 1970, 1980, 1990, 2000,2010,2020]},
-        value=2020,
-        step=1,
+def interactive_components():
+    #built per page load (see serve_layout) so the slider and the dropdowns follow the data being served
+    current = state
+    first, last = min(current.year_index), max(current.year_index)
+    marks = {str(i): '{}'.format(str(i)) for i in [1950, 1960, 1970, 1980, 1990, 2000, 2010, 2020] + [last]}
+
+    #years
+    year_slider = dcc.Slider(
+            id='year_slider',
+            min=first,
+            max=last,
+            marks=marks,
+            value=last,
+            step=1,
+        )
+
+    #season range
+    range_slider = dcc.RangeSlider(
+            id='range_slider',
+            min=first,
+            max=last,
+            marks=marks,
+            value=[2000, last],
+            step=1,
+            allowCross=False,
+            updatemode='drag',
+        )
+
+    #circuits
+    circuit_dropdown = dcc.Dropdown(
+        id='circuit_dropdown',
+        options=[{'label': k, 'value': k} for k in current.all_circuit_options[last]],
+        value=current.all_circuit_options[last][0],
+        clearable=False,
+        style={'font-family': 'Helvetica'}
+    )
+
+    #drivers
+    driver_dropdown = dcc.Dropdown(
+        id='driver_dropdown',
+        options=[{'label': k, 'value': k} for k in current.driver_options[last]],
+        value=current.driver_defaults[last],
+        clearable=False,
+        style={'font-family': 'Helvetica'}
     )
 
-#circuits
-all_circuit_options={}
-for year in list(f1_data['year'].unique()):
-    all_circuit_options[year] = list(f1_data[f1_data['year']==year]['circuit'].unique())
+    #option lists for every year, sent once with the page and read by the clientside callbacks in assets/dropdowns.js
+    dropdown_options = dcc.Store(id='dropdown_options', data={'circuits': dict(current.all_circuit_options), 'drivers': dict(current.driver_options), 'driver_defaults': dict(current.driver_defaults)})
+
+    #the version the page was built from, for the race chart urls
+    version = dcc.Store(id='data_version', data=current.data_version)
 
+    return year_slider, range_slider, circuit_dropdown, driver_dropdown, dropdown_options, version
 
-circuit_dropdown = dcc.Dropdown(
-    id='circuit_dropdown',
-    options=[{'label': k, 'value': k} for k in all_circuit_options.keys()],
-    value = 'Austrian Grand Prix',
-    clearable=False,
-    style={'font-family': 'Helvetica'}
+#race wins or points in the race charts at the top of the page
+race_chart_value = dcc.RadioItems(
+    id='race_chart_value',
+    options=[{'label': 'Race wins', 'value': 'wins'}, {'label': 'Points', 'value': 'points'}],
+    value='wins',
+    inline=True,
+    style={'font-family': 'Helvetica', 'color': 'white', 'font-size': '20px'}
 )
 
-#drivers
-driver_options={}
-for year in list(f1_data['year'].unique()):
-    driver_options[year] = list(f1_data[f1_data['year']==year]['full_name'].unique())
-
-driver_dropdown = dcc.Dropdown(
-    id='driver_dropdown',
-    options=[{'label': k, 'value': k} for k in driver_options.keys()],
-    value='Lewis Hamilton',
-    clearable=False,
-    style={'font-family': 'Helvetica'}
+range_stat = dcc.RadioItems(
+    id='range_stat',
+    options=[{'label': stat.capitalize(), 'value': stat} for stat in RANGE_STATS],
+    value='points',
+    inline=True,
+    style={'font-family': 'Helvetica', 'color': 'white', 'font-size': '20px'}
 )
 
+circuit_stat = dcc.RadioItems(
+    id='circuit_stat',
+    options=[{'label': circuit_stat_labels[stat][0], 'value': stat} for stat in CIRCUIT_STATS],
+    value='fastest_lap_ms',
+    inline=True,
+    style={'font-family': 'Helvetica', 'color': 'white', 'font-size': '20px'}
+)
 
 #tab colors
 tab_style = {
@@ -85,217 +362,451 @@ tab_selected_style = {
 
     
 }
+
 ##################################################APP###################################################################
 
-app = dash.Dash(__name__)
+#gzip/brotli responses (flask-compress)
+app = dash.Dash(__name__, compress=True)
 app.title = 'Formula One Dash'
 
 server = app.server
 
-app.layout = html.Div([
-
-    #main title
-    html.H1('🏁 Formula 1 History Dashboard 🏁', className='box box_title',style={'font-size': '40px',}),
-
-    #race charts
-    html.Div([
-        
-        #drivers
+#year / (year, gp) / driver callbacks are memoized per dataset version, see memo.py. memo passes them the state it
+#read as their first argument, so the response is stored under the version it was computed from
+memo = CallbackMemo(MEMO_DIR, lambda: state)
+
+#callback phase timings, cache hit rates and response sizes at /metrics, see metrics.py
+metrics.register(server)
+metrics.cache_collector('wiki', wiki.cache)
+metrics.cache_collector('memo', memo)
+
+#/racecharts/<drivers|teams>.json, loaded by the race chart graphs at the top of the page
+racechart.register(server, lambda: (state.race_charts, state.data_version))
+
+#/search/drivers?q=..., queried by the driver dropdown while typing
+search.register(server, lambda: state.driver_search)
+
+def gp_laps(current, year, gp):
+    race_ids = gp_rows(current, year, gp)['raceId'].unique()
+    return current.laps[current.laps['raceId'].isin(race_ids)].sort_values(by=['raceId','lap','position'], kind='mergesort')
+
+def team_standings(current, year):
+    standings = current.aggregates['seasons'][year]['team_standings']
+    return standings.rename('points').sort_values(ascending=False, kind='mergesort').reset_index()
+
+#/export/<view>?<params>&format=csv|jsonl|parquet&limit=N, the rows behind each tab as downloads, see export.py
+export.register(server, {
+    'season': (['year'], lambda current, year: year_rows(current, int(year))),
+    'gp': (['year', 'gp'], lambda current, year, gp: gp_rows(current, int(year), gp)),
+    'driver': (['name'], driver_rows),
+    'standings': (['year'], lambda current, year: current.aggregates['seasons'][int(year)]['driver_standings']),
+    'team_standings': (['year'], lambda current, year: team_standings(current, int(year))),
+    'laps': (['year', 'gp'], lambda current, year, gp: gp_laps(current, int(year), gp)),
+    'all_laps': ([], lambda current: current.laps),
+}, lambda: state)
+
+#the numbers of the season, grand prix and driver tabs as json values, for /api/v1 and the callbacks below
+def season_standings(current, year):
+    season = current.aggregates['seasons'].get(year)
+    if season is None:
+        return None
+    drivers = season['driver_standings'].sort_values(by='total_points', ascending=False, kind='mergesort')
+    teams = team_standings(current, year)
+    return {
+        'driver_champion': season['driver_champion'],
+        'team_champion': season['team_champion'],
+        'drivers': [{'name': name, 'code': code, 'points': float(points)}
+                    for code, name, points in zip(drivers['code'], drivers['full_name'], drivers['total_points'])],
+        'teams': [{'team': team, 'points': float(points)}
+                  for team, points in zip(teams['constructor'], teams['points'])],
+    }
+
+def gp_summary(current, year, gp):
+    race = gp_rows(current, year, gp)
+    winner = race[race['position']==1]
+    fastest = race['fastest_lap_ms'].min()
+    record = current.lap_records.get(gp)
+    return {
+        'winner': winner['full_name'].iloc[0] if len(winner) else None,
+        'fastest_lap_ms': None if pd.isna(fastest) else int(fastest),
+        'fastest_lap': None if pd.isna(fastest) else format_lap_time(int(fastest)),
+        'accidents': current.aggregates['seasons'][year]['accidents'].get(gp, 0) if year in current.year_index else 0,
+        #fastest lap ever driven at this grand prix
+        'lap_record': dict(record[0]) if record else None,
+    }
+
+def season_races(current, year):
+    if year not in current.year_index:
+        return None
+    return {gp: gp_summary(current, year, gp) for gp in current.all_circuit_options[year]}
+
+def career_summary(current, name):
+    career = current.aggregates['careers'].get(name)
+    if career is None:
+        return None
+    wins = career['wins_per_year']
+    return {
+        'first_year': career['first_year'],
+        'last_year': career['last_year'],
+        'races': career['races'],
+        'titles': career['titles'],
+        'wins': int(wins.sum()),
+        'wins_per_year': {int(year): int(n) for year, n in wins.items()},
+        'status_counts': {str(status): int(n) for status, n in career['status_counts'].items()},
+    }
+
+#/api/v1/standings?year=..., /api/v1/races?year=..., /api/v1/drivers?name=... (batches: repeat the param or separate
+#with commas), see api.py
+api.register(server, {
+    'standings': ('year', int, season_standings),
+    'races': ('year', int, season_races),
+    'drivers': ('name', str, career_summary),
+}, lambda: state)
+
+def serve_layout():
+    year_slider, range_slider, circuit_dropdown, driver_dropdown, dropdown_options, version = interactive_components()
+    return html.Div([
+
+        #main title
+        html.H1('🏁 Formula 1 History Dashboard 🏁', className='box box_title',style={'font-size': '40px',}),
+
+        #race charts
+        html.Div([race_chart_value], className='box box_graph'),
         html.Div([
-            html.Video(src='/static/pilot_winners.mp4',controls = False,loop=True,width="100%", height="300",autoPlay=True,muted=True),
-        ], style={'width': '50%'}, className='box box_graph'),
         
-        #teams
-        html.Div([
-            html.Video(src='/static/team_winners.mp4',controls = False,loop=True,width="100%", height="300",autoPlay=True,muted=True),
-        ], style={'width': '50%'}, className='box box_graph'),
+            #drivers
+            html.Div([
+                dcc.Graph(id='driver_race_chart', config={'displayModeBar': False}, style={'height': '300px'}),
+            ], style={'width': '50%'}, className='box box_graph'),
+        
+            #teams
+            html.Div([
+                dcc.Graph(id='team_race_chart', config={'displayModeBar': False}, style={'height': '300px'}),
+            ], style={'width': '50%'}, className='box box_graph'),
 
-    ], className='row'),
+        ], className='row'),
     
-    #subtitle
-    html.H2('Explore Statistics by Year!', className='box box_graph'),
-
-    #year slider
-    html.Div([
-            year_slider,
-            html.H2([],id='selected_year'),
-                ], className='box box_graph'),
+        #subtitle
+        html.H2('Explore Statistics by Year!', className='box box_graph'),
 
-    #tabs
-    dcc.Tabs([
-        #Tab 1 Year info
-        dcc.Tab(label='Year Info', children=[
-            #div row 1 (map)
-            html.Div([
-                #column (map)
+        #year slider
+        html.Div([
+                dropdown_options,
+                version,
+                year_slider,
+                html.H2([],id='selected_year'),
+                    ], className='box box_graph'),
+
+        #what each tab last rendered, set by the clientside callbacks in assets/tabs.js only while that tab is open
+        dcc.Store(id='year_request'),
+        dcc.Store(id='gp_year_request'),
+        dcc.Store(id='gp_request'),
+        dcc.Store(id='driver_request'),
+        dcc.Store(id='range_request'),
+        dcc.Store(id='compare_request'),
+        dcc.Store(id='circuit_stat_request'),
+
+        #tabs
+        dcc.Tabs(id='tabs', value='year', children=[
+            #Tab 1 Year info
+            dcc.Tab(label='Year Info', value='year', children=[
+                #div row 1 (map)
                 html.Div([
-                    dcc.Graph(id='year_map')
-                ], className='box box_graph',style={'width':'100%'})
+                    #column (map)
+                    html.Div([
+                        dcc.Graph(id='year_map', figure=year_map_figure)
+                    ], className='box box_graph',style={'width':'100%'})
                     
-            ], className='row'),
+                ], className='row'),
 
-            #div row 2 (standings drivers + teams)
-            html.Div([
-                dcc.Graph(id='driver_standings', style={'width': '50%'}, className='box box_graph'),
-                dcc.Graph(id='teams_standings', style={'width': '50%'}, className='box box_graph')
-            ], className='row'),
-        ],selected_style = tab_selected_style, style=tab_style),
-
-        #Tab 2 circuits
-        dcc.Tab(label='Grand Prix', children=[
-            #Circuit input
-            html.Div([
-                html.Div([],style={'width':'33%'}),
+                #div row 2 (standings drivers + teams)
                 html.Div([
-                    html.H3('Select the Grand Prix:'),
-                    circuit_dropdown,
-                ], className='',style={'width':'33%'}),
-                html.Div([],style={'width':'33%'}),
-            ],className='row'),
-
-            # Selected year circuit info
-            html.Div([
+                    dcc.Graph(id='driver_standings', figure=driver_standings_figure, style={'width': '50%'}, className='box box_graph'),
+                    dcc.Graph(id='teams_standings', figure=teams_standings_figure, style={'width': '50%'}, className='box box_graph')
+                ], className='row'),
+            ],selected_style = tab_selected_style, style=tab_style),
+
+            #Tab 2 circuits
+            dcc.Tab(label='Grand Prix', value='gp', children=[
+                #Circuit input
                 html.Div([
-                    html.H1([],id='circuit_fastlap_text'),
-                    html.H3('Year Fastest Lap ⏱'),
-                ], style={'width': '33%'}, className='box'),
+                    html.Div([],style={'width':'33%'}),
+                    html.Div([
+                        html.H3('Select the Grand Prix:'),
+                        circuit_dropdown,
+                    ], className='',style={'width':'33%'}),
+                    html.Div([],style={'width':'33%'}),
+                ],className='row'),
 
+                # Selected year circuit info
                 html.Div([
-                    html.H1([],id='circuit_winner_text'),
-                    html.H3('Winner 🥇'),
-                ], style={'width': '33%'}, className='box'),
-                html.Div([
-                    html.H1([],id='circuit_acidents_text'),
-                    html.H3('Acidents 💥'),
-                ], style={'width': '33%'}, className='box'),
-            ],className="row"),
+                    html.Div([
+                        html.H1([],id='circuit_fastlap_text'),
+                        html.H3('Year Fastest Lap ⏱'),
+                    ], style={'width': '33%'}, className='box'),
+
+                    html.Div([
+                        html.H1([],id='circuit_winner_text'),
+                        html.H3('Winner 🥇'),
+                    ], style={'width': '33%'}, className='box'),
+                    html.Div([
+                        html.H1([],id='circuit_acidents_text'),
+                        html.H3('Acidents 💥'),
+                    ], style={'width': '33%'}, className='box'),
+                ],className="row"),
             
-            html.Div([
-                #circuit map
                 html.Div([
-                    html.Div([],id='circuit_map')
-                ], style={'width': '60%','object-fit': 'contain','display':'flex','justify-content':'center','align-items':'center'}, className='box box_graph'),
+                    #circuit map
+                    html.Div([
+                        html.Div([],id='circuit_map')
+                    ], style={'width': '60%','object-fit': 'contain','display':'flex','justify-content':'center','align-items':'center'}, className='box box_graph'),
                 
-                # circuit historic info
-                html.Div([
-                    html.H1('Historic Fastest Lap Record'),
+                    # circuit historic info
                     html.Div([
+                        html.H1('Historic Fastest Lap Record'),
                         html.Div([
-                                html.H2([],id='driver_record'),
-                                html.H3('Driver'),
-                        ],style={'width':'50%'}, className='box'),
+                            html.Div([
+                                    html.H2([],id='driver_record'),
+                                    html.H3('Driver'),
+                            ],style={'width':'50%'}, className='box'),
+                            html.Div([
+                                html.H2([],id='lap_record'),
+                                html.H3('Lap Time'),
+                            ],style={'width':'50%'}, className='box'),
+                        ],className='row'),
                         html.Div([
-                            html.H2([],id='lap_record'),
-                            html.H3('Lap Time'),
-                        ],style={'width':'50%'}, className='box'),
-                    ],className='row'),
+                            html.Div([
+                                html.H2([],id='speed_record'),
+                                html.H3('Average Speed (Km/h)'),
+                            ],style={'width':'50%'}, className='box'),
+                            html.Div([
+                                html.H2([],id='year_record'),
+                                html.H3('Year'),
+                            ],style={'width':'50%'}, className='box'),
+                        ],className='row'),
+                    ], style={'width': '40%'}, className='box box_graph'),
+                ], className='row'),
+
+                #race analysis (lap by lap)
+                html.Div([
+                    dcc.Graph(id='race_positions', figure=race_positions_figure, style={'width': '50%'}, className='box box_graph'),
+                    dcc.Graph(id='race_gaps', figure=race_gaps_figure, style={'width': '50%'}, className='box box_graph'),
+                ], className='row'),
+                html.Div([
                     html.Div([
-                        html.Div([
-                            html.H2([],id='speed_record'),
-                            html.H3('Average Speed (Km/h)'),
-                        ],style={'width':'50%'}, className='box'),
-                        html.Div([
-                            html.H2([],id='year_record'),
-                            html.H3('Year'),
-                        ],style={'width':'50%'}, className='box'),
-                    ],className='row'),
-                ], style={'width': '40%'}, className='box box_graph'),
-            ], className='row'),
-
-        ],selected_style = tab_selected_style, style=tab_style),
-
-        #Tab 3 drivers
-        dcc.Tab(label='Drivers', children=[
-            #driver input
-            html.Div([
-                html.Div([],style={'width':'33%'}),
+                        dcc.Graph(id='race_lap_times', figure=race_lap_times_figure)
+                    ], className='box box_graph', style={'width':'100%'})
+                ], className='row'),
+
+                #grand prix history (every year it was held) and every grand prix side by side
                 html.Div([
-                    html.H3('Drivers in selected year:'),
-                    driver_dropdown,
-                ], className='',style={'width':'33%'}),
-                html.Div([],style={'width':'33%'}),
-            ],className='row'),
+                    html.Div([
+                        dcc.Graph(id='circuit_trends', figure=circuit_trends_figure)
+                    ], className='box box_graph', style={'width':'100%'})
+                ], className='row'),
+                html.Div([
+                    html.Div([
+                        circuit_stat,
+                        dcc.Graph(id='circuit_heatmap', figure=circuit_heatmap_figure),
+                    ], className='box box_graph', style={'width':'100%'})
+                ], className='row'),
 
-            html.Div([
-                html.Div([], style={'width': '0%'}),
-                html.Div([ 
+            ],selected_style = tab_selected_style, style=tab_style),
 
-                        #photo and summary
-                        html.Div([
-                            html.Div([],id='driver_photo', style={'width': '34%','display':'flex','justify-content':'center'}),
-                            html.Div([],id='driver_summary', className='box box_graph', style={'width': '66%', 'color':'white', 'text-align': 'justify', 'text-justify': 'inter-word','font-family': 'Helvetica','font-size':'20px'}),
-                        ], className='row'),
+            #Tab 3 drivers
+            dcc.Tab(label='Drivers', value='drivers', children=[
+                #driver input
+                html.Div([
+                    html.Div([],style={'width':'33%'}),
+                    html.Div([
+                        html.H3('Drivers in selected year (type to search all years):'),
+                        driver_dropdown,
+                    ], className='',style={'width':'33%'}),
+                    html.Div([],style={'width':'33%'}),
+                ],className='row'),
 
-                        #quick info
-                        html.Div([
-                            html.Div([
-                                html.H1([],id='driver_years'),
-                                html.H3('Years in F1'),
-                            ], style={'width': '33%'}, className='box'),
+                html.Div([
+                    html.Div([], style={'width': '0%'}),
+                    html.Div([ 
 
+                            #photo and summary
                             html.Div([
-                                html.H1([],id='driver_races'),
-                                html.H3('Nº Races'),
-                            ], style={'width': '33%'}, className='box'),
+                                html.Div([],id='driver_photo', style={'width': '34%','display':'flex','justify-content':'center'}),
+                                html.Div([],id='driver_summary', className='box box_graph', style={'width': '66%', 'color':'white', 'text-align': 'justify', 'text-justify': 'inter-word','font-family': 'Helvetica','font-size':'20px'}),
+                            ], className='row'),
 
+                            #quick info
                             html.Div([
-                                html.H1([],id='driver_wc'),
-                                html.H3('World Champion Titles'),
-                            ], style={'width': '33%'}, className='box'),
-                        ], className='row'),
-                ], style={'width': '100%'}, className='box box_graph'),
-                html.Div([], style={'width': '0%'}),               
-            ], className='row'),
+                                html.Div([
+                                    html.H1([],id='driver_years'),
+                                    html.H3('Years in F1'),
+                                ], style={'width': '33%'}, className='box'),
+
+                                html.Div([
+                                    html.H1([],id='driver_races'),
+                                    html.H3('Nº Races'),
+                                ], style={'width': '33%'}, className='box'),
+
+                                html.Div([
+                                    html.H1([],id='driver_wc'),
+                                    html.H3('World Champion Titles'),
+                                ], style={'width': '33%'}, className='box'),
+                            ], className='row'),
+                    ], style={'width': '100%'}, className='box box_graph'),
+                    html.Div([], style={'width': '0%'}),               
+                ], className='row'),
             
-            #charts
-            html.Div([
-                #driver wins
+                #charts
                 html.Div([
-                    dcc.Graph(id='driver_points')
-                ],style={'width': '50%'}, className='box box_graph'),
+                    #driver wins
+                    html.Div([
+                        dcc.Graph(id='driver_points')
+                    ],style={'width': '50%'}, className='box box_graph'),
                 
-                #driver status
+                    #driver status
+                    html.Div([
+                        dcc.Graph(id='driver_status')
+                    ],style={'width': '50%'}, className='box box_graph'),
+                ], className='row'),
+
+                #head to head
                 html.Div([
-                    dcc.Graph(id='driver_status')
-                ],style={'width': '50%'}, className='box box_graph'),
-            ], className='row'),
-        ],selected_style = tab_selected_style, style=tab_style),    
-    ]),
-])
+                    html.Div([],style={'width':'20%'}),
+                    html.Div([
+                        html.H3('Compare drivers (type to search):'),
+                        dcc.Dropdown(id='compare_dropdown', multi=True, placeholder='Two or more drivers', style={'font-family': 'Helvetica'}),
+                    ], className='',style={'width':'60%'}),
+                    html.Div([],style={'width':'20%'}),
+                ],className='row'),
+                html.Div([
+                    html.Div([],id='compare_table', className='box box_graph', style={'width': '100%', 'color':'white', 'font-family': 'Helvetica','font-size':'20px'}),
+                ], className='row'),
+                html.Div([
+                    dcc.Graph(id='compare_positions', style={'width': '50%'}, className='box box_graph'),
+                    dcc.Graph(id='compare_dnf', style={'width': '50%'}, className='box box_graph'),
+                ], className='row'),
+            ],selected_style = tab_selected_style, style=tab_style),    
+
+            #Tab 4 season ranges
+            dcc.Tab(label='Seasons', value='range', children=[
+                html.Div([
+                    range_slider,
+                    html.H2([],id='selected_range'),
+                    range_stat,
+                ], className='box box_graph'),
+
+                html.Div([
+                    dcc.Graph(id='range_drivers', figure=range_drivers_figure, style={'width': '50%'}, className='box box_graph'),
+                    dcc.Graph(id='range_teams', figure=range_teams_figure, style={'width': '50%'}, className='box box_graph'),
+                ], className='row'),
+            ],selected_style = tab_selected_style, style=tab_style),
+        ]),
+    ])
+
+app.layout = serve_layout
+
 ######################################################Callbacks#########################################################
 
+#race charts
+app.clientside_callback(
+    ClientsideFunction(namespace='f1', function_name='race_chart'),
+    Output('driver_race_chart', 'figure'),
+    Input('data_version', 'data'),
+    Input('race_chart_value', 'value'),
+    State('driver_race_chart', 'id'))
+
+app.clientside_callback(
+    ClientsideFunction(namespace='f1', function_name='race_chart'),
+    Output('team_race_chart', 'figure'),
+    Input('data_version', 'data'),
+    Input('race_chart_value', 'value'),
+    State('team_race_chart', 'id'))
+
 #year slider
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='f1', function_name='selected_year'),
     Output('selected_year', 'children'),
     Input('year_slider', 'value'))
-def ret_year(year):
-    return html.H4(year)
 
 #circuit dropdown
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='f1', function_name='circuit_options'),
     Output('circuit_dropdown', 'options'),
-    Input('year_slider', 'value'))
-def set_cities_options(selected_year):
-    return [{'label': i, 'value': i} for i in all_circuit_options[selected_year]]
-
-@app.callback(
     Output('circuit_dropdown', 'value'),
-    Input('circuit_dropdown', 'options'))
-def set_cities_value(available_options):
-    return available_options[0]['value']
+    Input('year_slider', 'value'),
+    State('dropdown_options', 'data'),
+    State('circuit_dropdown', 'value'))
 
 #driver dropdown
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='f1', function_name='driver_options'),
     Output('driver_dropdown', 'options'),
-    Input('year_slider', 'value'))
-def set_cities_options(selected_year):
-    return [{'label': i, 'value': i} for i in driver_options[selected_year]]
-
-@app.callback(
     Output('driver_dropdown', 'value'),
-    Input('driver_dropdown', 'options'))
-def set_cities_value(available_options):
-    return available_options[13]['value']
+    Input('year_slider', 'value'),
+    State('dropdown_options', 'data'),
+    State('driver_dropdown', 'value'))
+
+app.clientside_callback(
+    ClientsideFunction(namespace='f1', function_name='driver_search'),
+    Output('driver_dropdown', 'options', allow_duplicate=True),
+    Input('driver_dropdown', 'search_value'),
+    State('driver_dropdown', 'value'),
+    prevent_initial_call=True)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='f1', function_name='driver_search'),
+    Output('compare_dropdown', 'options'),
+    Input('compare_dropdown', 'search_value'),
+    State('compare_dropdown', 'value'),
+    prevent_initial_call=True)
+
+#tab gates: the data callbacks below listen to these stores instead of the slider and dropdowns, so hidden tabs
+#compute nothing and catch up with the latest inputs when they are opened
+app.clientside_callback(
+    ClientsideFunction(namespace='f1', function_name='year_request'),
+    Output('year_request', 'data'),
+    Input('tabs', 'value'),
+    Input('year_slider', 'value'),
+    State('year_request', 'data'))
+
+app.clientside_callback(
+    ClientsideFunction(namespace='f1', function_name='gp_request'),
+    Output('gp_year_request', 'data'),
+    Output('gp_request', 'data'),
+    Input('tabs', 'value'),
+    Input('year_slider', 'value'),
+    Input('circuit_dropdown', 'value'),
+    State('gp_year_request', 'data'),
+    State('gp_request', 'data'))
+
+app.clientside_callback(
+    ClientsideFunction(namespace='f1', function_name='driver_request'),
+    Output('driver_request', 'data'),
+    Input('tabs', 'value'),
+    Input('driver_dropdown', 'value'),
+    State('driver_request', 'data'))
+
+app.clientside_callback(
+    ClientsideFunction(namespace='f1', function_name='compare_request'),
+    Output('compare_request', 'data'),
+    Input('tabs', 'value'),
+    Input('compare_dropdown', 'value'),
+    State('compare_request', 'data'))
+
+app.clientside_callback(
+    ClientsideFunction(namespace='f1', function_name='range_request'),
+    Output('range_request', 'data'),
+    Input('tabs', 'value'),
+    Input('range_slider', 'value'),
+    Input('range_stat', 'value'),
+    State('range_request', 'data'))
+
+app.clientside_callback(
+    ClientsideFunction(namespace='f1', function_name='circuit_stat_request'),
+    Output('circuit_stat_request', 'data'),
+    Input('tabs', 'value'),
+    Input('circuit_stat', 'value'),
+    State('circuit_stat_request', 'data'))
 
 #year map + standings
 @app.callback(
@@ -305,156 +816,215 @@ def set_cities_value(available_options):
         Output("teams_standings", "figure"),
     ],
     [
-        Input("year_slider", "value"),
-    ]
+        Input("year_request", "data"),
+    ],
+    prevent_initial_call=True,
 )
-def plots(year):
+@metrics.timed
+@memo
+def plots(current, year):
+    #only the trace data and titles change between years; the layouts are the static figures above
+    lap = metrics.Stopwatch('plots')
     #map
-    plot_data = f1_data[f1_data['year']==year].drop_duplicates(subset=['country'])
-    prix_plot_data = f1_data[f1_data['year']==(year)]
-    prix = len(prix_plot_data['circuit'].drop_duplicates())
-    data_choropleth = dict(type='choropleth',
-                           locations=plot_data['country'],
-                           locationmode='country names',
-                           z=plot_data['round'],
-                           colorscale=['red'] * (len(plot_data['round'])+1),
-                           showscale= False
-                          )
-
-    layout_choropleth = dict(geo=dict(
-                                      projection=dict(type='equirectangular'
-                                                     ),
-                                      showland=True,   
-                                      landcolor='white',
-                                      lakecolor='#242e3f',
-                                      showocean=True,
-                                      oceancolor='#242e3f',
-                                      showframe=False
-                                     ),
-                            margin=dict(
-                                        l=0,
-                                        r=0,
-                                        b=20,
-                                        t=50,
-                                            ),
-                            dragmode = False,
-                            plot_bgcolor = '#242e3f',
-                            paper_bgcolor = '#242e3f',
-                            font= {'color': 'white','size':15},         
-                            title=dict(text=f'{year} Grand Prix Locations ({prix} circuits)',
-                                    x=.5 
-                                    )
-                            )
-    year_map_plot = go.Figure(data=data_choropleth, layout=layout_choropleth)
-
-    #Driver standings
-    plot_data = f1_data[f1_data['year']==year]
-    plot_data = plot_data[plot_data['round']==plot_data['round'].max()]
-
-    plot_data_1 = f1_data[f1_data['year']==(year-1)]
-    plot_data_1 = plot_data_1[plot_data_1['round']==plot_data_1['round'].max()]
-
-    plot_data_2 = f1_data[f1_data['year']==(year-2)]
-    plot_data_2 = plot_data_2[plot_data_2['round']==plot_data_2['round'].max()]
-
-    fig_driver = go.Figure()
-    fig_driver.add_trace(go.Bar(
-        x=plot_data['code'],
-        y=plot_data['total_points'],
-        name=f'{year}',
-        marker_color='#ff0000'
-    ))
-    fig_driver.add_trace(go.Bar(
-        x=plot_data_1['code'],
-        y=plot_data_1['total_points'],
-        name=f'{year-1}',
-        marker_color='#2C4562'
-    ))
-
-    fig_driver.update_layout(barmode='group',
-                             xaxis_tickangle=-45,
-                             xaxis_title="Driver Code",
-                             yaxis_title="Points",
-                             title={'text':"Driver Standings",
-                                    'x':0.5},
-                            plot_bgcolor = '#242e3f',
-                            paper_bgcolor = '#242e3f',
-                            font= {'color': 'white','size':15},
-                             )
-    driver_stands_plot = fig_driver
-
-    #Team standings
-    plot_data = f1_data[f1_data['year']==(year)]
-    plot_data = plot_data.groupby('constructor')['points'].sum()
-    plot_data = plot_data.sort_values()
-    colors = {'Alfa Romeo': '#910002',
-              'Ferrari': '#ff0000',
-              'AlphaTauri': '#2C4562',
-              'Haas F1 Team': '#FFFFFF',
-              'McLaren': '#ff9900',
-              'Mercedes': '#00D2BE',
-              'Racing Point': '#ff00ff',
-              'Red Bull': '#1401EE',
-              'Renault': 'yellow',
-              'Williams': '#015BFF',
-              'BMW Sauber': '#010076',
-              'Toro Rosso': '#2C4562',
-              'Toyota': '#d0003e',
-              'Honda': '#030001',
-              'Force India': '#ff00ff',
-              'Brawn': '#ffff00',
-              'Sauber': '#1401EE',
-              'Lotus F1': '#cccc00',
-              'Jordan': '#ffcc00',
-              'BAR': 'white',
-              'Benetton': '#003300',
-              'Super Aguri': '#cc0000',
-              'Marussia': '#800000',
-              'Manor Marussia': '#800000',
-              'MF1': '#ff3300',
-              'Minardi': '#333399',
-              'Arrows': '#3366cc',
-              'Prost': 'red',
-              'Caterham': '#669900',
-              'Lotus': '#cccc00',
-              'Virgin': '#ff6600',
-              'HRT': '#669999',
-              'Spyker': '#f5f5f0',
-              'Jaguar':'#669900'
-             }
+    season = year_rows(current, year)
+    lap('select')
+    plot_data = season.drop_duplicates(subset=['country'])
+    prix = len(season['circuit'].drop_duplicates())
+
+    year_map_plot = Patch()
+    year_map_plot['data'][0]['locations'] = plot_data['country'].tolist()
+    year_map_plot['data'][0]['z'] = plot_data['round'].tolist()
+    year_map_plot['layout']['title']['text'] = f'{year} Grand Prix Locations ({prix} circuits)'
+    lap('figure')
+
+    #Driver standings, as served by /api/v1/standings
+    standings = season_standings(current, year)
+    standings_1 = season_standings(current, year-1)
+    lap('aggregate')
+
+    driver_stands_plot = Patch()
+    for i, (season_standing, season_year) in enumerate([(standings, year), (standings_1, year-1)]):
+        drivers = season_standing['drivers'] if season_standing else []
+        driver_stands_plot['data'][i]['x'] = [driver['code'] for driver in drivers]
+        driver_stands_plot['data'][i]['y'] = [driver['points'] for driver in drivers]
+        driver_stands_plot['data'][i]['name'] = f'{season_year}'
+    lap('figure')
+
+    #Team standings (the champion at the top of the horizontal bars)
+    teams = standings['teams'][::-1]
     try:
-        colors = [colors[k] for k in plot_data.index]
+        colors = [team_colors[team['team']] for team in teams]
     except:
         colors = px.colors.qualitative.Light24
 
-    fig_team = go.Figure()
-
-
-    fig_team.add_trace(go.Bar(
-        x=plot_data.values,
-        y=plot_data.index,
-        name=f'{year} World Championship',
-        marker_color=colors,
-        orientation='h'
-    ))
-
-    fig_team.update_layout(barmode='group', xaxis_tickangle=-45,
-                            xaxis_title="Points",
-                            title={'text':"Team Standings",'x':0.5},
-                            plot_bgcolor = '#242e3f',
-                            paper_bgcolor = '#242e3f',
-                            font= {'color': 'white','size':15},)
-                                                                    
-    teams_stands_plot = fig_team
+    teams_stands_plot = Patch()
+    teams_stands_plot['data'][0]['x'] = [team['points'] for team in teams]
+    teams_stands_plot['data'][0]['y'] = [team['team'] for team in teams]
+    teams_stands_plot['data'][0]['name'] = f'{year} World Championship'
+    teams_stands_plot['data'][0]['marker']['color'] = colors
+    lap('figure')
 
     return year_map_plot, \
            driver_stands_plot, \
            teams_stands_plot
 
+#head to head
+@app.callback(
+    [
+        Output("compare_table", "children"),
+        Output("compare_positions", "figure"),
+        Output("compare_dnf", "figure"),
+    ],
+    [
+        Input("compare_request", "data"),
+    ],
+    prevent_initial_call=True,
+)
+@metrics.timed
+@memo
+def head_to_head(current, names):
+    lap = metrics.Stopwatch('head_to_head')
+    result = current.head_to_head_index.compare(tuple(names))
+    lap('aggregate')
+
+    fig_positions = go.Figure()
+    fig_dnf = go.Figure()
+    if result is None:
+        table = html.P(['Pick two or more drivers to compare them in the races they shared.'])
+    else:
+        drivers = result['drivers']
+        delta = lambda v, unit='': '-' if v is None else f'{v:+g}{unit}'
+        rows = [
+            ('Finished ahead', [d['ahead'] for d in drivers]),
+            ('Points', [d['points'] for d in drivers]),
+            ('Average grid', ['-' if d['mean_grid'] is None else d['mean_grid'] for d in drivers]),
+            (f'Grid vs {drivers[0]["name"]}', [delta(d['grid_delta']) for d in drivers]),
+            (f'Fastest lap vs {drivers[0]["name"]}', [delta(None if d['fastest_lap_delta_ms'] is None else d['fastest_lap_delta_ms'] / 1000, ' s') for d in drivers]),
+            ('Not classified', [sum(d['dnf'].values()) for d in drivers]),
+        ]
+        table = html.Table([
+            html.Caption(f'{result["shared"]} shared races'),
+            html.Tr([html.Th('')] + [html.Th(d['name']) for d in drivers]),
+        ] + [html.Tr([html.Td(label)] + [html.Td(value) for value in values]) for label, values in rows],
+            style={'width': '100%', 'text-align': 'center'})
+
+        for d in drivers:
+            fig_positions.add_trace(go.Scatter(x=result['races'], y=d['positions'], name=d['name'], mode='markers'))
+            fig_dnf.add_trace(go.Bar(x=list(d['dnf'].values()), y=list(d['dnf'].keys()), name=d['name'], orientation='h'))
+    fig_positions.update_layout(title={'text': 'Finishing position in shared races', 'x': 0.5},
+                                yaxis={'autorange': 'reversed'}, xaxis={'showticklabels': False},
+                                **dark_layout)
+    fig_dnf.update_layout(barmode='stack', title={'text': 'Why they were not classified', 'x': 0.5},
+                          **dark_layout)
+    lap('figure')
+
+    return table, \
+           fig_positions, \
+           fig_dnf
+
+#season range totals (not memoized: a range costs one subtraction per driver/constructor)
+@app.callback(
+    [
+        Output("range_drivers", "figure"),
+        Output("range_teams", "figure"),
+        Output("selected_range", "children"),
+    ],
+    [
+        Input("range_request", "data"),
+    ],
+    prevent_initial_call=True,
+)
+@metrics.timed
+def range_plots(request):
+    lap = metrics.Stopwatch('range_plots')
+    first, last, stat = request
+    range_sums = state.range_sums
+    drivers, driver_totals = range_totals(range_sums, 'full_name', stat, first, last)
+    teams, team_totals = range_totals(range_sums, 'constructor', stat, first, last)
+    lap('aggregate')
+
+    span = f'{first}' if first == last else f'{first}–{last}'
+    fig_drivers = Patch()
+    fig_drivers['data'][0]['x'] = driver_totals
+    fig_drivers['data'][0]['y'] = drivers
+    fig_drivers['layout']['title']['text'] = f'Drivers · {stat} {span}'
+
+    fig_teams = Patch()
+    fig_teams['data'][0]['x'] = team_totals
+    fig_teams['data'][0]['y'] = teams
+    fig_teams['data'][0]['marker']['color'] = [team_colors.get(team, '#2C4562') for team in teams]
+    fig_teams['layout']['title']['text'] = f'Constructors · {stat} {span}'
+    lap('figure')
+
+    return fig_drivers, \
+           fig_teams, \
+           f'Seasons {span}'
+
+#grand prix history (not memoized: one row of each stat table)
+@app.callback(
+    Output("circuit_trends", "figure"),
+    Input("gp_request", "data"),
+    prevent_initial_call=True)
+@metrics.timed
+def circuit_trends(gp):
+    lap = metrics.Stopwatch('circuit_trends')
+    matrix = state.circuit_matrix
+    row = matrix['rows'].get(gp)
+    lap('select')
+
+    fig = Patch()
+    for i, stat in enumerate(CIRCUIT_STATS):
+        values = matrix[stat][row] if row is not None else np.empty(0, dtype=np.float32)
+        held = ~np.isnan(values)
+        fig['data'][i]['x'] = matrix['years'][:len(values)][held].tolist()
+        fig['data'][i]['y'] = (values[held].astype(np.float64) * circuit_stat_labels[stat][1]).round(3).tolist()
+    fig['layout']['title']['text'] = f'{gp} through the years'
+    lap('figure')
+    return fig
+
+#every grand prix x every year for one stat (not memoized: one table to a list)
+@app.callback(
+    Output("circuit_heatmap", "figure"),
+    Input("circuit_stat_request", "data"),
+    prevent_initial_call=True)
+@metrics.timed
+def circuit_heatmap(stat):
+    lap = metrics.Stopwatch('circuit_heatmap')
+    matrix = state.circuit_matrix
+    label, scale = circuit_stat_labels[stat]
+    values = (matrix[stat].astype(np.float64) * scale).round(3)
+    lap('select')
+
+    fig = Patch()
+    fig['data'][0]['x'] = matrix['years'].tolist()
+    fig['data'][0]['y'] = list(matrix['circuits'])
+    #as an array: dash's encoder writes a float array (NaN as null) in one call instead of visiting ~3000 floats
+    fig['data'][0]['z'] = values
+    fig['data'][0]['colorbar'] = {'title': {'text': label}}
+    #accidents and slow laps are the bad end of their scale
+    fig['data'][0]['reversescale'] = stat in ('fastest_lap_ms', 'accident_rate')
+    fig['layout']['height'] = max(400, 22 * len(matrix['circuits']))
+    fig['layout']['title']['text'] = f'{label} by grand prix and year'
+    lap('figure')
+    return fig
+
+#circuit map (separate callback so the numbers don't wait on wikipedia)
+@app.callback(
+    Output("circuit_map", "children"),
+    Input("gp_request", "data"),
+    prevent_initial_call=True)
+@metrics.timed
+def circuit_map(gp):
+    lap = metrics.Stopwatch('circuit_map')
+    src = wiki.circuit_image(gp)
+    lap('fetch')
+    if not src:
+        return html.H3('Track map unavailable')
+    return html.Img(src=src, style={'height':'100%', 'width':'100%','object-fit': 'contain',})
+
 #circuit info
 @app.callback(
     [           
-        Output("circuit_map", "children"),
         Output("circuit_winner_text", "children"),
         Output("circuit_fastlap_text", "children"),
         Output("circuit_acidents_text", "children"),
@@ -465,58 +1035,32 @@ def plots(year):
 
     ],
     [
-        Input("year_slider", "value"),
-        Input("circuit_dropdown", "value"),
-    ]
+        Input("gp_year_request", "data"),
+        Input("gp_request", "data"),
+    ],
+    prevent_initial_call=True,
 )
-
-def circuit_info(year,gp):
-    #circuit map
-    if gp == 'Eifel Grand Prix':
-        lk= 'https://upload.wikimedia.org/wikipedia/commons/thumb/7/76/N%C3%BCrburgring_-_Grand-Prix-Strecke.svg/600px-N%C3%BCrburgring_-_Grand-Prix-Strecke.svg.png'
-        img_link = html.Img(src=lk, style={'height':'100%', 'width':'100%','object-fit': 'contain' }),
-    elif gp == 'Tuscan Grand Prix':
-        lk= 'https://upload.wikimedia.org/wikipedia/commons/thumb/3/38/Mugello_Racing_Circuit_track_map_15_turns.svg/600px-Mugello_Racing_Circuit_track_map_15_turns.svg.png'
-        img_link = html.Img(src=lk, style={'height':'100%', 'width':'100%','object-fit': 'contain' }),
-    elif gp == 'Styrian Grand Prix':
-        lk= 'https://upload.wikimedia.org/wikipedia/commons/thumb/b/b2/Circuit_Red_Bull_Ring.svg/600px-Circuit_Red_Bull_Ring.svg.png'
-        img_link = html.Img(src=lk, style={'height':'100%', 'width':'100%','object-fit': 'contain' }),  
+@metrics.timed
+@memo
+def circuit_info(current, year, gp):
+    lap = metrics.Stopwatch('circuit_info')
+    #winner, fastest lap, accidents and the historic lap record, as served by /api/v1/races
+    summary = gp_summary(current, year, gp)
+    lap('aggregate')
+    winner_name = summary['winner'] or '-'
+    fastest = summary['fastest_lap'] or '-'
+    accidents = summary['accidents']
+
+    record = summary['lap_record']
+    if record:
+        driver_record = record['driver']
+        lap_record = record['lap_time']
+        speed_record = '-' if record['speed'] is None else f"{record['speed']:.3f}"
+        year_record = record['year']
     else:
-        link_gp_replace = gp.replace(' ', '%20')
-        link = f"https://en.wikipedia.org/w/api.php?action=query&format=json&formatversion=2&prop=pageimages|pageterms&piprop=thumbnail&pithumbsize=600&titles={link_gp_replace}"
-        with urllib.request.urlopen(link) as url:
-            data = json.loads(url.read().decode())
-        
-        img_link = html.Img(src=data['query']['pages'][0]['thumbnail']['source'], style={'height':'100%', 'width':'100%','object-fit': 'contain',})
-
-    #circuit winner
-    winner = f1_data[(f1_data['year']==year)&(f1_data['circuit']==gp)]
-    winner = winner[winner['position']=='1']
-    winner_name = winner['full_name'].values[0]
-
-    #circuit fastest lap
-    fastest = f1_data[(f1_data['year']==year)&(f1_data['circuit']==gp)]
-    fastest = fastest[fastest['fastestLapTime'] != '-']
-    fastest = fastest[fastest['fastestLapTime'] == fastest['fastestLapTime'].min()]['fastestLapTime'].values[0]
-
-    #circuit accidents
-    accidents = f1_data[(f1_data['year']==year)&(f1_data['circuit']==gp)]
-    accidents = accidents[(accidents['status']=='Accident')|(accidents['status']=='Collision')|(accidents['status']=='Fatal accident')|(accidents['status']=='Collision damage')]
-    accidents = len(accidents)
-
-    #circuit historic lap 
-    laps_circuit = laps[laps['circuit']==gp]
-    laps_circuit['time'] = laps_circuit['time'].replace('\\N','0')
-    laps_circuit['time'] = laps_circuit['time'].str.replace(':','').astype(float)
-    fastest_ever = laps_circuit[laps_circuit['time']==laps_circuit['time'].min()]
-
-    driver_record = fastest_ever['full_name'].values[0]
-    lap_record = fastest_ever['fastestLapTime'].values[0]
-    speed_record = fastest_ever['fastestLapSpeed'].values[0]
-    year_record = fastest_ever['year'].values[0]
-
-    return img_link, \
-            winner_name, \
+        driver_record = lap_record = speed_record = year_record = '-'
+
+    return winner_name, \
             fastest, \
             accidents, \
             driver_record, \
@@ -524,13 +1068,83 @@ def circuit_info(year,gp):
             speed_record,\
             year_record,  
 
+#race analysis
+@app.callback(
+    [
+        Output("race_positions", "figure"),
+        Output("race_gaps", "figure"),
+        Output("race_lap_times", "figure"),
+    ],
+    [
+        Input("gp_year_request", "data"),
+        Input("gp_request", "data"),
+    ],
+    prevent_initial_call=True,
+)
+@metrics.timed
+@memo
+def race_analysis(current, year, gp):
+    #the layouts are the static figures above; traces go out as plain dicts, which skips plotly's validation of every
+    #trace (most of the time of this callback when it built go.Figures)
+    lap = metrics.Stopwatch('race_analysis')
+    #a grand prix name can cover two races in one year (Bahrain 2020): every race with lap times gets its traces
+    race = gp_rows(current, year, gp).drop_duplicates(subset=['raceId']).sort_values(by='round', kind='mergesort')
+    traces = [(int(race_round), current.lap_engine.race_trace(int(race_id))) for race_id, race_round in zip(race['raceId'], race['round'])]
+    traces = [(race_round, trace) for race_round, trace in traces if trace]
+    lap('aggregate')
+
+    positions, gaps, lap_times = [], [], []
+    for race_round, trace in traces:
+        suffix = f' (round {race_round})' if len(traces) > 1 else ''
+        for driver in trace['drivers']:
+            name = driver['name'] + suffix
+            positions.append(dict(type='scatter', mode='lines', x=driver['laps'], y=driver['position'], name=name))
+            gaps.append(dict(type='scatter', mode='lines', x=driver['laps'], y=driver['gap'], name=name))
+            lap_times.append(dict(type='box', x=[name], name=name, showlegend=False,
+                                  **{k: [v] for k, v in driver['lap_times'].items()}))
+
+    title = f'{year} {gp}' if traces else f'No lap times for the {year} {gp}'
+    fig_positions = Patch()
+    fig_positions['data'] = positions
+    fig_positions['layout']['title']['text'] = f'Position by lap · {title}'
+    fig_gaps = Patch()
+    fig_gaps['data'] = gaps
+    fig_lap_times = Patch()
+    fig_lap_times['data'] = lap_times
+    lap('figure')
+
+    return fig_positions, \
+           fig_gaps, \
+           fig_lap_times
+
+#driver photo + summary (separate callback so the charts don't wait on wikipedia)
+@app.callback(
+    [
+        Output("driver_photo", "children"),
+        Output("driver_summary", "children"),
+    ],
+    [
+        Input("driver_request", "data"),
+    ],
+    prevent_initial_call=True,
+)
+@metrics.timed
+def driver_media(name):
+    lap = metrics.Stopwatch('driver_media')
+    src, summary = wiki.driver_media(name)
+    lap('fetch')
+    photo_link = html.Img(src=src, style={'max-height':'330px', 'width':'auto','object-fit': 'contain',}) if src else html.H3('Photo unavailable')
+
+    summary = summary or 'Summary unavailable.'
+    text = ' '.join(re.split(r'(?<=[.])\s', summary)[:5])
+    text = html.P([text])
+    return photo_link, text
+
 #drivers
 @app.callback(
     [           
         Output("driver_points", "figure"),
         Output("driver_status", "figure"),
-        Output("driver_photo", "children"),
-        Output("driver_summary", "children"),
         Output("driver_years", "children"),
         Output("driver_races", "children"),
         Output("driver_wc", "children"),
@@ -538,100 +1152,127 @@ def circuit_info(year,gp):
 
     ],
     [
-        Input("driver_dropdown", "value"),
-    ]
+        Input("driver_request", "data"),
+    ],
+    prevent_initial_call=True,
 )
-def driver_info(name):
-    #driver wins
-    driver = f1_data[(f1_data['full_name']==name)]
-    driver['position'] = driver['position'].replace('\\N','0')
-    driver['position'] = driver['position'].astype(int)
-    wins = driver[driver['position']==1]
-    wins = wins.groupby('year')['position'].sum()
+@metrics.timed
+@memo
+def driver_info(current, name):
+    lap = metrics.Stopwatch('driver_info')
+    #driver wins, as served by /api/v1/drivers
+    career = career_summary(current, name)
+    wins = career['wins_per_year']
+    lap('aggregate')
 
     fig_points = go.Figure()
 
     fig_points.add_trace(go.Bar(
-        x=wins.index,
-        y=wins.values,
+        x=list(wins),
+        y=list(wins.values()),
         name=f'Wins per year',
         marker_color='red',
     ))
 
     fig_points.update_layout(barmode='group', xaxis_tickangle=-45,
                         yaxis_title="Races Won",
-                        title={'text':f"{name} won {wins.sum()} races in his career"},
-                        plot_bgcolor = '#242e3f',
-                        paper_bgcolor = '#242e3f',
-                        font= {'color': 'white','size':15},)
+                        title={'text':f"{name} won {career['wins']} races in his career"},
+                        **dark_layout)
     fig_points.update_yaxes(dtick=1)
     fig_points.update_xaxes(dtick=1)
 
 
     #driver status
-    driver = f1_data[(f1_data['full_name']==name)]
-    status = driver.groupby('status')['status'].count()
+    status = career['status_counts']
 
-    labels = status.index
-    values = status.values
+    labels = list(status)
+    values = list(status.values())
 
     fig_status = px.pie(values=values, names=labels,
                  title='Most common status by the end of a race',
                 )
     fig_status.update_traces(textposition='inside', textinfo='value+label')
-    fig_status.update_layout(plot_bgcolor = '#242e3f',paper_bgcolor = '#242e3f',font= {'color': 'white','size':15})
-    #driver photo
-    if name == 'George Russell':
-        photo_link = html.Img(src='https://upload.wikimedia.org/wikipedia/commons/thumb/3/36/2019_Formula_One_tests_Barcelona%2C_Russell_%2833376134568%29.jpg/226px-2019_Formula_One_tests_Barcelona%2C_Russell_%2833376134568%29.jpg', style={'max-height':'330px', 'width':'auto','object-fit': 'contain',}),
-
-    else:
-        link_name_replace = name.replace(' ', '%20')
-        link = f"https://en.wikipedia.org/w/api.php?action=query&format=json&formatversion=2&prop=pageimages|pageterms&piprop=thumbnail&pithumbsize=500&redirects=1&titles={link_name_replace}"
-        with urllib.request.urlopen(link) as url:
-            data = json.loads(url.read().decode())
-        
-        photo_link = html.Img(src=data['query']['pages'][0]['thumbnail']['source'], style={'max-height':'330px', 'width':'auto','object-fit': 'contain',}),
-
-    #driver summary
-    if name == 'George Russell':
-        link='https://en.wikipedia.org/w/api.php?format=json&action=query&prop=extracts&exintro&explaintext&redirects=1&titles=George%20Russell%20(racing%20driver)'
-    else:
-        x = name.replace(' ', '%20')
-        link = f"https://en.wikipedia.org/w/api.php?format=json&action=query&prop=extracts&exintro&explaintext&redirects=1&titles={x}"
-    with urllib.request.urlopen(link) as url:
-        data = json.loads(url.read().decode())
-        data = data['query']['pages']
-        
-        values_view = data.values()
-
-        value_iterator = iter(values_view)
-        first_value = next(value_iterator)
-        summary = first_value['extract']
-        text = ' '.join(re.split(r'(?<=[.])\s', summary)[:5])
-        text = html.P([text])
+    fig_status.update_layout(**dark_layout)
+    lap('figure')
 
     #driver year in f1
-    first_year = f1_data[f1_data['full_name']==name]['year'].min()
-    last_year = f1_data[f1_data['full_name']==name]['year'].max()
-    total_years = last_year - first_year
+    total_years = career['last_year'] - career['first_year']
 
     #driver nº races
-    n_races = len(f1_data[f1_data['full_name']==name])   
+    n_races = career['races']
 
     #driver nº of WC
-    champions = f1_data.groupby('year')['total_points'].max().to_frame().reset_index().merge(f1_data[['full_name','year','total_points']],on=['year','total_points']).drop_duplicates(subset='year')['full_name'].value_counts()
-    try:
-        champion = champions[name]
-    except:
-        champion = 0
+    champion = career['titles']
     return fig_points, \
             fig_status,\
-            photo_link, \
-            text, \
             total_years, \
             n_races,\
             champion
 
 
+######################################################Reload############################################################
+
+#seconds between looks at the snapshot manifest for a newer dataset (published by ingest.py); 0 turns reloading off
+DATA_RELOAD_INTERVAL = float(os.environ.get('DATA_RELOAD_INTERVAL', 10))
+reload_lock = threading.Lock()
+next_reload_check = [time.time() + DATA_RELOAD_INTERVAL]
+
+def memo_keep(changed_years, new):
+    #which stored callback responses still hold on the new data: the ones that read none of the changed seasons
+    changed = set(changed_years)
+    seasons = new.f1_data[new.f1_data['year'].isin(changed)]
+    touched_drivers = set(seasons['full_name'])
+    touched_gps = set(seasons['circuit'])
+    rules = {
+        'plots': lambda year: year not in changed and year - 1 not in changed,
+        #the historic lap record covers every year of the grand prix
+        'circuit_info': lambda year, gp: year not in changed and gp not in touched_gps,
+        'race_analysis': lambda year, gp: year not in changed,
+        'driver_info': lambda name: name not in touched_drivers,
+        'head_to_head': lambda names: not touched_drivers.intersection(names or ()),
+    }
+    return lambda name, args: name in rules and rules[name](*args)
+
+def reload_data():
+    #swap in the snapshot the manifest points to. a snapshot published on top of the one being served only regroups
+    #its changed seasons and keeps the memoized responses of the others
+    global state
+    current = state
+    manifest = read_manifest()
+    if not manifest or manifest.get('version') == current.data_version:
+        return False
+    new_data, new_laps, version = load_data()
+    if version == current.data_version:
+        return False
+    incremental = manifest.get('previous') == current.data_version and manifest.get('version') == version
+    changed_years = manifest.get('changed_years') if incremental else None
+    new = load_state(new_data, new_laps, version, changed_years, current if changed_years is not None else None)
+    #the new version's memo store (with the responses carried over) is ready before the first request can read `new`
+    memo.switch(version, memo_keep(changed_years, new) if changed_years is not None else None)
+    state = new
+    return True
+
+def reload_in_background():
+    try:
+        reload_data()
+    finally:
+        reload_lock.release()
+
+@server.before_request
+def check_data_version():
+    #every worker looks at the manifest at most once per interval; the rebuild runs beside the requests, which keep
+    #being answered from the old data until it is swapped in
+    if not DATA_RELOAD_INTERVAL or time.time() < next_reload_check[0]:
+        return
+    next_reload_check[0] = time.time() + DATA_RELOAD_INTERVAL
+    if reload_lock.acquire(blocking=False):
+        threading.Thread(target=reload_in_background, daemon=True).start()
+
+#MEMO_WARMUP=1 pre-renders every year in the background, MEMO_WARMUP=full also every grand prix and driver. with
+#gunicorn's preload_app this module is imported in the master, which must not fork the workers while a thread holds
+#one of their locks; gunicorn.conf.py then takes MEMO_WARMUP out of the environment and runs the warmup in when_ready
+if os.environ.get('MEMO_WARMUP'):
+    threading.Thread(target=warmup, args=(sys.modules[__name__], os.environ['MEMO_WARMUP'] == 'full'), daemon=True).start()
+
 if __name__ == '__main__':
     app.run_server(debug=True)
@@ -0,0 +1,59 @@
+// per-year dropdown options live in the 'dropdown_options' store, so a year change rebuilds the
+// option lists in the browser and only the callbacks that read data go back to the server
+window.dash_clientside = Object.assign({}, window.dash_clientside);
+window.dash_clientside.f1 = Object.assign({}, window.dash_clientside.f1, {
+    selected_year: function(year) {
+        return {namespace: 'dash_html_components', type: 'H4', props: {children: year}};
+    },
+
+    // keep the current selection when it exists in the new year, otherwise fall back to `fallback`
+    year_options: function(year, store, current, key, fallback) {
+        var names = store[key][String(year)] || [];
+        var options = names.map(function(name) { return {label: name, value: name}; });
+        var value = names.indexOf(current) >= 0 ? current : names[Math.min(fallback, names.length - 1)];
+        return [options, value];
+    },
+
+    circuit_options: function(year, store, current) {
+        return window.dash_clientside.f1.year_options(year, store, current, 'circuits', 0);
+    },
+
+    driver_options: function(year, store, current) {
+        var names = store.drivers[String(year)] || [];
+        var fallback = names.indexOf(store.driver_defaults[String(year)]);
+        return window.dash_clientside.f1.year_options(year, store, current, 'drivers', Math.max(fallback, 0));
+    },
+
+    // search every driver in history while typing: waits for a 150 ms pause, and an answer that arrives after a
+    // newer keystroke is dropped
+    driver_search: function(query, current) {
+        var no_update = window.dash_clientside.no_update;
+        var f1 = window.dash_clientside.f1;
+        if (!query) {
+            return no_update;
+        }
+        var ticket = f1.search_ticket = (f1.search_ticket || 0) + 1;
+        return new Promise(function(resolve) { setTimeout(resolve, 150); }).then(function() {
+            if (ticket !== f1.search_ticket) {
+                return no_update;
+            }
+            return fetch('search/drivers?size=20&q=' + encodeURIComponent(query)).then(function(response) {
+                return response.json();
+            }).then(function(found) {
+                if (ticket !== f1.search_ticket) {
+                    return no_update;
+                }
+                var options = found.results.map(function(driver) {
+                    return {label: driver.name + ' (' + driver.first_year + '–' + driver.last_year + ')', value: driver.name};
+                });
+                // selected drivers keep an option, or the dropdown would clear them (current is a list when multi)
+                [].concat(current || []).forEach(function(name) {
+                    if (!found.results.some(function(driver) { return driver.name === name; })) {
+                        options.push({label: name, value: name});
+                    }
+                });
+                return options;
+            });
+        });
+    }
+});
@@ -0,0 +1,18 @@
+// the race charts are served as json by /racecharts/<name>.json (racechart.py) instead of travelling in the layout,
+// so the browser caches them per dataset version (the version is in the url)
+(function() {
+    var charts = {driver_race_chart: 'drivers', team_race_chart: 'teams'};
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside);
+    window.dash_clientside.f1 = Object.assign({}, window.dash_clientside.f1, {
+        race_chart: function(version, value, id) {
+            var name = charts[id] + (value === 'points' ? '-points' : '');
+            return fetch('racecharts/' + name + '.json?v=' + encodeURIComponent(version)).then(function(response) {
+                if (!response.ok) {
+                    return window.dash_clientside.no_update;
+                }
+                return response.json();
+            });
+        }
+    });
+})();
@@ -0,0 +1,54 @@
+// a tab's request stores only change while the tab is open and its inputs differ from what it last rendered,
+// so a slider tick recomputes the visible tab and the others catch up when they are opened
+(function() {
+    var no_update = function() { return window.dash_clientside.no_update; };
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside);
+    window.dash_clientside.f1 = Object.assign({}, window.dash_clientside.f1, {
+        year_request: function(tab, year, last_year) {
+            if (tab !== 'year' || year === last_year) {
+                return no_update();
+            }
+            return year;
+        },
+
+        gp_request: function(tab, year, gp, last_year, last_gp) {
+            if (tab !== 'gp' || gp == null || (year === last_year && gp === last_gp)) {
+                return [no_update(), no_update()];
+            }
+            // a store that is written fires its callbacks even with the same value: a year change alone leaves
+            // gp_request alone, so the track map and history charts of the grand prix do not re-run
+            return [year === last_year ? no_update() : year, gp === last_gp ? no_update() : gp];
+        },
+
+        driver_request: function(tab, name, last_name) {
+            if (tab !== 'drivers' || name == null || name === last_name) {
+                return no_update();
+            }
+            return name;
+        },
+
+        compare_request: function(tab, names, last_names) {
+            names = names || [];
+            if (tab !== 'drivers' || JSON.stringify(names) === JSON.stringify(last_names)) {
+                return no_update();
+            }
+            return names;
+        },
+
+        circuit_stat_request: function(tab, stat, last_stat) {
+            if (tab !== 'gp' || stat === last_stat) {
+                return no_update();
+            }
+            return stat;
+        },
+
+        range_request: function(tab, span, stat, last) {
+            var request = [span[0], span[1], stat];
+            if (tab !== 'range' || (last && request.every(function(v, i) { return v === last[i]; }))) {
+                return no_update();
+            }
+            return request;
+        }
+    });
+})();
@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import wikistub
+
+#latency / memory benchmark of the dashboard callbacks. imports app.py with wikipedia replaced by wikistub.py and
+#sweeps every year, every (year, grand prix) and every driver, either calling the callbacks directly or posting to
+#dash's /_dash-update-component through the flask test client (--e2e).
+#
+#    python bench.py --json bench.json                 # write a run
+#    python bench.py --compare bench.json              # compare against it, exit 1 on a regression
+
+#callback name -> one of its outputs, to find it in app.callback_map for --e2e
+OUTPUTS = {
+    'plots': 'year_map.figure',
+    'circuit_info': 'circuit_winner_text.children',
+    'circuit_map': 'circuit_map.children',
+    'race_analysis': 'race_positions.figure',
+    'driver_info': 'driver_points.figure',
+    'driver_media': 'driver_photo.children',
+    'range_plots': 'range_drivers.figure',
+    'head_to_head': 'compare_table.children',
+    'circuit_trends': 'circuit_trends.figure',
+    'circuit_heatmap': 'circuit_heatmap.figure',
+}
+
+######################################################Helpers###########################################################
+
+def summarize(samples):
+    ms = np.array(samples) * 1000
+    if not len(ms):
+        return {'count': 0}
+    return {
+        'count': len(ms),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'max_ms': round(float(ms.max()), 3),
+    }
+
+def peak_rss_mb():
+    #ru_maxrss is in kB on linux, bytes on macos
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+def dash_payload(dash_app, output, values):
+    #body of a /_dash-update-component request for the callback that writes `output`, with `values` as its inputs
+    key = next(key for key in dash_app.callback_map if output in key)
+    spec = dash_app.callback_map[key]
+    if key.startswith('..'):
+        outputs = [dict(zip(('id', 'property'), part.rsplit('.', 1))) for part in key[2:-2].split('...')]
+    else:
+        outputs = dict(zip(('id', 'property'), key.rsplit('.', 1)))
+    inputs = [dict(spec_input, value=value) for spec_input, value in zip(spec['inputs'], values)]
+    return {
+        'output': key,
+        'outputs': outputs,
+        'inputs': inputs,
+        'changedPropIds': [f'{inputs[0]["id"]}.{inputs[0]["property"]}'],
+        'state': [],
+    }
+
+def sweeps(app, limit=None):
+    #callback name -> list of argument tuples
+    years = sorted(app.state.year_index)
+    races = sorted(app.state.circuit_index)
+    drivers = sorted(app.state.driver_index)
+    gps = sorted({gp for _, gp in races})
+    cases = {
+        'plots': [(year,) for year in years],
+        'circuit_info': races,
+        'circuit_map': [(gp,) for gp in gps],
+        'race_analysis': races,
+        'driver_info': [(name,) for name in drivers],
+        'driver_media': [(name,) for name in drivers],
+        'head_to_head': [([a, b],) for a, b in zip(drivers, drivers[1:])],
+        'circuit_trends': [(gp,) for gp in gps],
+        'circuit_heatmap': [(stat,) for stat in app.CIRCUIT_STATS],
+        'range_plots': [([first, last, stat],) for first in years for last in years[::10] if first <= last for stat in app.RANGE_STATS],
+    }
+    if limit:
+        cases = {name: args[:limit] for name, args in cases.items()}
+    return cases
+
+######################################################Run###############################################################
+
+def run(e2e=False, memo=False, limit=None, repeat=1):
+    workdir = tempfile.mkdtemp(prefix='f1bench-')
+    stub, url = wikistub.start()
+    os.environ['WIKI_API'] = url
+    os.environ['WIKI_CACHE_DIR'] = os.path.join(workdir, 'wiki_cache')
+    os.environ['MEMO_DIR'] = os.path.join(workdir, 'memo_cache')
+    os.environ['MEMO'] = '1' if memo else '0'
+
+    start = time.perf_counter()
+    import app
+    import_seconds = time.perf_counter() - start
+
+    client = app.server.test_client() if e2e else None
+    callbacks = {}
+    for name, cases in sweeps(app, limit).items():
+        fn = getattr(app, name)
+        samples, sizes, errors = [], [], 0
+        for _ in range(repeat):
+            for args in cases:
+                start = time.perf_counter()
+                try:
+                    if e2e:
+                        response = client.post('/_dash-update-component', json=dash_payload(app.app, OUTPUTS[name], args))
+                        if response.status_code != 200:
+                            raise RuntimeError(response.status_code)
+                        sizes.append(len(response.data))
+                    else:
+                        fn(*args)
+                except Exception:
+                    errors += 1
+                    continue
+                samples.append(time.perf_counter() - start)
+        callbacks[name] = dict(summarize(samples), errors=errors)
+        if sizes:
+            callbacks[name]['mean_bytes'] = int(np.mean(sizes))
+
+    stub.shutdown()
+    return {
+        'meta': {
+            'mode': 'e2e' if e2e else 'direct',
+            'memo': memo,
+            'limit': limit,
+            'repeat': repeat,
+            'data_version': app.state.data_version,
+            'python': platform.python_version(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'import_seconds': round(import_seconds, 3),
+        'peak_rss_mb': peak_rss_mb(),
+        'callbacks': callbacks,
+    }
+
+def compare(result, baseline, threshold):
+    #callbacks whose p50 or p95 got more than `threshold` slower (and by at least 1 ms)
+    regressions = []
+    for name, now in result['callbacks'].items():
+        before = baseline['callbacks'].get(name)
+        if not before or not now.get('count') or not before.get('count'):
+            continue
+        for stat in ('p50_ms', 'p95_ms'):
+            if now[stat] > before[stat] * (1 + threshold) and now[stat] - before[stat] >= 1:
+                regressions.append(f'{name} {stat}: {before[stat]} -> {now[stat]}')
+    return regressions
+
+def print_result(result):
+    print(f'import {result["import_seconds"]}s, peak rss {result["peak_rss_mb"]} MB ({result["meta"]["mode"]}, memo={result["meta"]["memo"]})')
+    print(f'{"callback":<14}{"calls":>7}{"errors":>8}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"max ms":>10}')
+    for name, stats in result['callbacks'].items():
+        if stats['count']:
+            print(f'{name:<14}{stats["count"]:>7}{stats["errors"]:>8}{stats["p50_ms"]:>10}{stats["p95_ms"]:>10}{stats["p99_ms"]:>10}{stats["max_ms"]:>10}')
+        else:
+            print(f'{name:<14}{0:>7}{stats["errors"]:>8}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the dashboard callbacks')
+    parser.add_argument('--e2e', action='store_true', help='post to /_dash-update-component instead of calling the callbacks')
+    parser.add_argument('--memo', action='store_true', help='keep callback memoization on (second and later calls are cache hits)')
+    parser.add_argument('--limit', type=int, help='only the first N cases of every sweep')
+    parser.add_argument('--repeat', type=int, default=1, help='run every sweep N times')
+    parser.add_argument('--json', metavar='PATH', help='write the result as json')
+    parser.add_argument('--compare', metavar='PATH', help='baseline json to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown before a regression is flagged (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    result = run(e2e=args.e2e, memo=args.memo, limit=args.limit, repeat=args.repeat)
+    print_result(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    #two tiers: an in-process LRU and a directory of json files shared by every worker on the box.
+    #entries past their ttl are refetched, and served stale if the refetch fails; ttl=None never expires.
+    #with serve_stale=False errors from fetch are raised instead. a value is shared by every thread that gets it, so
+    #callers only read it
+
+    def __init__(self, directory, ttl, max_memory=512, max_disk=5000, serve_stale=True):
+        self.directory = directory
+        self.serve_stale = serve_stale
+        self.ttl = ttl
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self.memory = OrderedDict()
+        self.overrides = {}
+        self.lock = threading.Lock()
+        self.counts = {'override_hits': 0, 'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stale': 0, 'errors': 0, 'timeouts': 0}
+
+    def seed(self, key, value):
+        #fixed values that never expire and never hit the network
+        self.overrides[key] = value
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def reset_counts(self):
+        with self.lock:
+            self.counts = dict.fromkeys(self.counts, 0)
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts, memory_entries=len(self.memory))
+
+    def path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+    def remember(self, key, entry):
+        with self.lock:
+            self.memory[key] = entry
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_memory:
+                self.memory.popitem(last=False)
+
+    def read_disk(self, key):
+        path = self.path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            #mtime doubles as the last access time for the disk LRU
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get('key') == key else None
+
+    def write_disk(self, key, entry):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = f'{self.path(key)}.{os.getpid()}.{threading.get_ident()}'
+            with open(tmp, 'w') as f:
+                json.dump(dict(entry, key=key), f)
+            os.replace(tmp, self.path(key))
+            self.evict_disk()
+        except OSError:
+            pass
+
+    def evict_disk(self):
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.json')]
+        if len(files) <= self.max_disk:
+            return
+        by_access = []
+        for path in files:
+            try:
+                by_access.append((os.stat(path).st_mtime, path))
+            except OSError:
+                pass
+        by_access.sort()
+        for _, path in by_access[:len(by_access) - self.max_disk]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def lookup(self, key):
+        #(entry, tier) from memory, else disk; (None, None) when neither has the key
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.memory.move_to_end(key)
+        if entry is not None:
+            return entry, 'memory_hits'
+        entry = self.read_disk(key)
+        if entry is not None:
+            self.remember(key, entry)
+            return entry, 'disk_hits'
+        return None, None
+
+    def peek(self, key):
+        #(value, fresh) of what is cached for key without ever fetching; (None, False) when nothing is
+        if key in self.overrides:
+            self.count('override_hits')
+            return self.overrides[key], True
+        entry, tier = self.lookup(key)
+        if entry is None:
+            return None, False
+        if entry['expires'] is None or entry['expires'] > time.time():
+            self.count(tier)
+            return entry['value'], True
+        return entry['value'], False
+
+    def get(self, key, fetch):
+        if key in self.overrides:
+            self.count('override_hits')
+            return self.overrides[key]
+
+        now = time.time()
+        entry, tier = self.lookup(key)
+        if entry is not None and (entry['expires'] is None or entry['expires'] > now):
+            self.count(tier)
+            return entry['value']
+
+        self.count('misses')
+        try:
+            value = fetch()
+        except Exception:
+            self.count('errors')
+            if not self.serve_stale:
+                raise
+            if entry is not None:
+                self.count('stale')
+                return entry['value']
+            return None
+
+        entry = {'value': value, 'expires': None if self.ttl is None else now + self.ttl}
+        self.remember(key, entry)
+        self.write_disk(key, entry)
+        return value
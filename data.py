@@ -0,0 +1,483 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+######################################################Sources###########################################################
+
+DATA_CSV = 'F1_data.csv'
+LAPS_CSV = 'lap_times.csv'
+SNAPSHOT_DIR = 'snapshot'
+
+#bump when the layout of a snapshot or the load steps below change, so old snapshots are rebuilt
+SNAPSHOT_FORMAT = 4
+
+ACCIDENT_STATUSES = ['Accident', 'Collision', 'Fatal accident', 'Collision damage']
+
+def lap_time_ms(times):
+    #'M:SS.mmm' (or 'SS.mmm') strings -> integer milliseconds, '\\N' and '-' -> <NA>
+    parts = times.str.extract(r'^(?:(\d+):)?(\d+(?:\.\d+)?)$')
+    minutes = pd.to_numeric(parts[0], errors='coerce').fillna(0)
+    seconds = pd.to_numeric(parts[1], errors='coerce')
+    return (minutes * 60000 + seconds * 1000).round().astype('Int64')
+
+def format_lap_time(ms):
+    return f'{ms // 60000}:{ms % 60000 / 1000:06.3f}'
+
+def normalize(f1_data):
+    #parse the raw csv encodings once: '\\N' positions, 'M:SS.mmm' lap times, speeds stored as text, accident statuses
+    f1_data['position'] = pd.to_numeric(f1_data['position'], errors='coerce').astype('Int64')
+    f1_data['fastest_lap_ms'] = lap_time_ms(f1_data['fastestLapTime'])
+    f1_data['fastestLapSpeed'] = pd.to_numeric(f1_data['fastestLapSpeed'], errors='coerce')
+    f1_data['is_accident'] = f1_data['status'].isin(ACCIDENT_STATUSES)
+    return f1_data
+
+def read_csv_data():
+    f1_data = normalize(pd.read_csv(DATA_CSV))
+    f1_data = f1_data.sort_values(by='forename')
+    laps = pd.read_csv(LAPS_CSV)
+    laps = pd.merge(laps,f1_data[['circuit','full_name','raceId','driverId','year','fastestLapSpeed','fastestLapTime']],on=['raceId','driverId'])
+    laps['time_ms'] = lap_time_ms(laps['time'])
+
+    #stable sort by year and round keeps the forename order inside each race, so every season and every race is one contiguous block
+    f1_data = f1_data.sort_values(by=['year','round'], kind='mergesort').reset_index(drop=True)
+    return f1_data, laps
+
+######################################################Derived tables####################################################
+
+def build_lap_records(laps, top=10, changed_years=None, previous=None):
+    #circuit -> the `top` fastest laps ever driven there, one entry per driver and race, fastest first. with the
+    #records of the snapshot before (`previous`) only the laps of `changed_years` are looked at again, unless the
+    #records they drop leave a grand prix short; those grand prix are redone from all their laps
+    if previous is not None:
+        changed = set(changed_years)
+        part = build_lap_records(laps[laps['year'].isin(list(changed))], top)
+        records, again = {}, []
+        for gp in list(previous) + [gp for gp in part if gp not in previous]:
+            kept = [record for record in previous.get(gp, ()) if record['year'] not in changed]
+            if len(kept) < len(previous.get(gp, ())) and len(previous[gp]) == top:
+                again.append(gp)
+            elif kept or gp in part:
+                records[gp] = sorted(kept + part.get(gp, []), key=lambda record: record['lap_ms'])[:top]
+        if again:
+            records.update(build_lap_records(laps[laps['circuit'].isin(again)], top))
+        return records
+    timed = laps[laps['time_ms'].notna()].sort_values(by=['circuit','time_ms'], kind='mergesort')
+    timed = timed.drop_duplicates(subset=['circuit','raceId','driverId'])
+    timed = timed.groupby('circuit', sort=False, observed=True).head(top)
+
+    records = {}
+    for gp, driver, ms, speed, year in zip(timed['circuit'], timed['full_name'], timed['time_ms'], timed['fastestLapSpeed'], timed['year']):
+        records.setdefault(gp, []).append({'driver': driver, 'lap_ms': int(ms), 'lap_time': format_lap_time(int(ms)), 'speed': None if pd.isna(speed) else float(speed), 'year': int(year)})
+    return records
+
+def season_tables(season):
+    #final standings, champions and accidents of one year, from that year's rows
+    last_round = season[season['round']==season['round'].max()]
+    teams = season.groupby('constructor', observed=True)['points'].sum().sort_values()
+    accidents = season[season['is_accident']].groupby('circuit', observed=True).size()
+    return {
+        'driver_standings': last_round[['code','full_name','total_points']].reset_index(drop=True),
+        'team_standings': teams,
+        'driver_champion': season.loc[season['total_points'].idxmax(), 'full_name'],
+        'team_champion': teams.index[-1],
+        'accidents': {gp: int(n) for gp, n in accidents.items()},
+    }
+
+def career_tables(rows, titles):
+    #the numbers on the Drivers tab for every driver in `rows`, grouped in one pass
+    rows = rows[['full_name','year','position','status']]
+    years = rows.groupby('full_name', observed=True)['year'].agg(['min','max','size'])
+    wins = rows[rows['position']==1].groupby(['full_name','year'], observed=True).size()
+    status = rows.groupby(['full_name','status'], observed=True).size()
+    wins = split_outer(wins)
+    status = split_outer(status)
+
+    careers = {}
+    for name, first_year, last_year, races in years.itertuples():
+        careers[name] = {
+            'wins_per_year': wins.get(name, no_wins),
+            'status_counts': status[name],
+            'first_year': int(first_year),
+            'last_year': int(last_year),
+            'races': int(races),
+            'titles': int(titles.get(name, 0)),
+        }
+    return careers
+
+def split_outer(counts):
+    #sorted (outer, inner) -> count series into {outer: series indexed by inner}, sliced without regrouping
+    outer = counts.index.get_level_values(0)
+    inner = counts.index.get_level_values(1)
+    values = counts.to_numpy()
+    change = np.flatnonzero(outer[1:] != outer[:-1]) + 1
+    starts = np.r_[0, change]
+    stops = np.r_[change, len(outer)]
+    return {outer[start]: pd.Series(values[start:stop], index=inner[start:stop]) for start, stop in zip(starts, stops) if stop > start}
+
+no_wins = pd.Series(dtype='int64', index=pd.Index([], dtype='int64', name='year'))
+
+def build_aggregates(f1_data, year_index, driver_index, changed_years=None, previous=None):
+    #season tables for `changed_years` (all years when None) and the careers of every driver those years touch;
+    #the rest is carried over from `previous`
+    full = previous is None or changed_years is None
+    if full:
+        changed_years = list(year_index)
+        previous = {'seasons': {}, 'careers': {}}
+    seasons = dict(previous['seasons'])
+    touched = set()
+    for year in changed_years:
+        if year in seasons:
+            touched.add(seasons[year]['driver_champion'])
+        if year in year_index:
+            season = f1_data.iloc[year_index[year]]
+            seasons[year] = season_tables(season)
+            touched.update(season['full_name'].unique())
+            touched.add(seasons[year]['driver_champion'])
+        else:
+            seasons.pop(year, None)
+
+    titles = pd.Series([s['driver_champion'] for s in seasons.values()], dtype=object).value_counts()
+    if full:
+        careers = career_tables(f1_data, titles)
+    else:
+        careers = {name: career for name, career in previous['careers'].items() if name not in touched}
+        names = [name for name in touched if name in driver_index]
+        if names:
+            careers.update(career_tables(f1_data.iloc[np.concatenate([driver_index[name] for name in names])], titles))
+    return {'seasons': seasons, 'careers': careers}
+
+RANGE_STATS = ['points', 'wins', 'podiums', 'accidents']
+
+def range_stats(rows):
+    position = rows['position']
+    return {
+        'points': rows['points'].fillna(0).to_numpy(dtype=np.float64),
+        'wins': (position == 1).fillna(False).to_numpy(dtype=np.float64),
+        'podiums': (position <= 3).fillna(False).to_numpy(dtype=np.float64),
+        'accidents': rows['is_accident'].to_numpy(dtype=np.float64),
+    }
+
+def build_range_sums(f1_data, entities=('full_name', 'constructor'), changed_years=None, previous=None):
+    #per driver/constructor and stat, totals up to every year as an (entity x year) prefix sum: the total over
+    #first..last is sums[:, last + 1] - sums[:, first], whatever the span. with the sums of the snapshot before
+    #(`previous`) only the rows of `changed_years` are added up again; the other years' totals are carried over
+    first_year = int(f1_data['year'].min())
+    n_years = int(f1_data['year'].max()) - first_year + 2
+    if previous is not None:
+        changed = sorted(changed_years)
+        rows = f1_data[f1_data['year'].isin(changed)]
+    else:
+        rows = f1_data
+    year = rows['year'].to_numpy() - first_year + 1
+    stats = range_stats(rows)
+    sums = {'first_year': first_year, 'last_year': first_year + n_years - 2}
+    for entity in entities:
+        if previous is None:
+            codes, names = pd.factorize(rows[entity])
+            names = np.asarray(names.astype(str), dtype=object)
+        else:
+            #entities first seen in the changed years go after the known ones
+            old = previous[entity]
+            new_names = pd.unique(rows[entity].astype(str))
+            names = np.concatenate([old['names'], [name for name in new_names if name not in set(old['names'])]]).astype(object)
+            codes = pd.Index(names).get_indexer(rows[entity].astype(str))
+            #the old years' own totals (undoing the prefix sum), without the changed years
+            old_columns = np.arange(previous['first_year'], previous['last_year'] + 1) - first_year + 1
+            keep = (old_columns >= 1) & (old_columns < n_years) & ~np.isin(old_columns + first_year - 1, changed)
+        table = {'names': names}
+        for stat, values in stats.items():
+            totals = np.zeros((len(names), n_years))
+            if previous is not None:
+                own = np.diff(old[stat], axis=1)
+                totals[:len(old['names']), old_columns[keep]] = own[:, keep]
+            np.add.at(totals, (codes, year), values)
+            table[stat] = np.cumsum(totals, axis=1)
+        sums[entity] = table
+    return sums
+
+def range_totals(sums, entity, stat, first, last, top=20):
+    #(names, totals) of the `top` entities over seasons first..last, largest first; one subtraction per entity
+    table = sums[entity]
+    lo = min(max(first, sums['first_year']), sums['last_year'] + 1) - sums['first_year']
+    hi = min(max(last, sums['first_year'] - 1), sums['last_year']) - sums['first_year'] + 1
+    totals = table[stat][:, hi] - table[stat][:, lo] if hi > lo else np.zeros(len(table['names']))
+    top = min(top, int((totals > 0).sum()))
+    if not top:
+        return [], []
+    best = np.argpartition(-totals, top - 1)[:top]
+    best = best[np.argsort(-totals[best], kind='stable')]
+    return table['names'][best].tolist(), totals[best].round(1).tolist()
+
+CIRCUIT_STATS = ['fastest_lap_ms', 'best_speed', 'finisher_ratio', 'accident_rate']
+
+def circuit_tables(f1_data, laps, years):
+    #(grand prix names, float64 tables over `years`) of the rows and laps given, in the order the grand prix first appear
+    first_year = int(years[0])
+    codes, circuits = pd.factorize(f1_data['circuit'])
+    year = f1_data['year'].to_numpy() - first_year
+    shape = (len(circuits), len(years))
+
+    entries = np.zeros(shape)
+    finished = np.zeros(shape)
+    accidents = np.zeros(shape)
+    np.add.at(entries, (codes, year), 1)
+    np.add.at(finished, (codes, year), f1_data['position'].notna().to_numpy(dtype=np.float64))
+    np.add.at(accidents, (codes, year), f1_data['is_accident'].to_numpy(dtype=np.float64))
+
+    fastest = np.full(shape, np.inf)
+    np.minimum.at(fastest, (codes, year), f1_data['fastest_lap_ms'].to_numpy(dtype=np.float64, na_value=np.inf))
+    lap_codes = pd.Index(circuits).get_indexer(laps['circuit'])
+    timed = (lap_codes >= 0) & laps['time_ms'].notna().to_numpy()
+    np.minimum.at(fastest, (lap_codes[timed], laps['year'].to_numpy()[timed] - first_year),
+                  laps['time_ms'].to_numpy(dtype=np.float64, na_value=np.inf)[timed])
+    fastest[np.isinf(fastest)] = np.nan
+
+    speed = np.full(shape, np.nan)
+    np.fmax.at(speed, (codes, year), f1_data['fastestLapSpeed'].to_numpy(dtype=np.float64))
+
+    with np.errstate(invalid='ignore'):
+        tables = {
+            'fastest_lap_ms': fastest,
+            'best_speed': speed,
+            'finisher_ratio': finished / entries,
+            'accident_rate': accidents / entries,
+        }
+    return np.asarray(circuits.astype(str), dtype=object), tables
+
+def build_circuit_matrix(f1_data, laps, changed_years=None, previous=None):
+    #(grand prix x year) float32 tables, NaN where it was not held or nothing was timed: fastest lap in ms (lap times
+    #and the drivers' fastest laps), best fastest-lap speed in km/h, share of starters classified and share out in an
+    #accident. grand prix are ordered by the first year they were held; 'rows' maps a name to its row. with the matrix
+    #of the snapshot before (`previous`) only the columns of `changed_years` are computed again
+    years = np.arange(int(f1_data['year'].min()), int(f1_data['year'].max()) + 1)
+    if previous is None:
+        circuits, tables = circuit_tables(f1_data, laps, years)
+    else:
+        changed = sorted(changed_years)
+        part_circuits, part = circuit_tables(f1_data[f1_data['year'].isin(changed)], laps[laps['year'].isin(changed)], years)
+        known = set(previous['circuits'])
+        circuits = np.concatenate([previous['circuits'], [gp for gp in part_circuits if gp not in known]]).astype(object)
+        rows = pd.Index(circuits).get_indexer(part_circuits)
+        columns = np.isin(years, changed)
+        #the previous snapshot's columns of the years that did not change
+        old_columns = pd.Index(years).get_indexer(previous['years'])
+        kept = (old_columns >= 0) & ~np.isin(previous['years'], changed)
+        tables = {}
+        for stat in CIRCUIT_STATS:
+            table = np.full((len(circuits), len(years)), np.nan)
+            table[:len(previous['circuits']), old_columns[kept]] = previous[stat][:, kept]
+            table[np.ix_(rows, np.flatnonzero(columns))] = part[stat][:, columns]
+            tables[stat] = table
+    #every start is either classified or not, so the finisher ratio is set exactly for the years a grand prix was held
+    held = ~np.isnan(tables['finisher_ratio'])
+    order = np.flatnonzero(held.any(axis=1))
+    order = order[np.argsort(held[order].argmax(axis=1), kind='stable')]
+    names = circuits[order]
+    matrix = {'circuits': names, 'years': years, 'rows': {name: i for i, name in enumerate(names)}}
+    for stat in CIRCUIT_STATS:
+        matrix[stat] = tables[stat][order].astype(np.float32)
+    return matrix
+
+######################################################Read-only#########################################################
+
+#the tables above are shared by every request thread of a worker. freeze() turns them read-only, so a callback that
+#writes into one fails with 'assignment destination is read-only' instead of changing what the other requests see.
+#the snapshot frames need nothing: their columns are read-only memory maps
+
+def frozen(array):
+    array = np.array(array)
+    array.flags.writeable = False
+    return array
+
+def freeze_column(values):
+    #read-only copy of a series' values with the same dtype
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return pd.Categorical.from_codes(frozen(values.cat.codes), dtype=values.dtype)
+    if isinstance(values.array, (pd.arrays.IntegerArray, pd.arrays.FloatingArray, pd.arrays.BooleanArray)):
+        return type(values.array)(frozen(values.to_numpy(dtype=values.dtype.numpy_dtype, na_value=0)), frozen(values.isna().to_numpy()))
+    return frozen(values.to_numpy())
+
+def freeze(value):
+    #arrays, frames and series become read-only, dicts mapping proxies, lists and sets tuples and frozensets, and the
+    #attributes of index objects (LapEngine, HeadToHead, ...) are frozen in place
+    if isinstance(value, np.ndarray):
+        if value.base is None:
+            value.flags.writeable = False
+            return value
+        return frozen(value) if value.flags.writeable else value
+    if isinstance(value, pd.DataFrame):
+        return pd.DataFrame({col: freeze_column(value[col]) for col in value.columns}, index=value.index, copy=False)
+    if isinstance(value, pd.Series):
+        return pd.Series(freeze_column(value), index=value.index, name=value.name, copy=False)
+    if isinstance(value, MappingProxyType):
+        #frozen before, e.g. a season's tables carried over from the previous snapshot
+        return value
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    if hasattr(value, '__dict__') and not callable(value):
+        for name, attribute in vars(value).items():
+            if not callable(attribute):
+                setattr(value, name, freeze(attribute))
+    return value
+
+######################################################Fingerprints######################################################
+
+def file_stat(path):
+    st = os.stat(path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def source_fingerprints():
+    sources = {}
+    for path in (DATA_CSV, LAPS_CSV):
+        sources[path] = dict(file_stat(path), sha1=file_hash(path))
+    return sources
+
+def dataset_version(sources):
+    h = hashlib.sha1(f'format={SNAPSHOT_FORMAT}'.encode())
+    for path in sorted(sources):
+        h.update(f'{path}={sources[path]["sha1"]}'.encode())
+    return h.hexdigest()[:16]
+
+######################################################Snapshot##########################################################
+
+#each frame is a directory with one .npy file per column; text columns are stored as integer codes plus a labels array,
+#so every file is a plain typed array that can be memory-mapped. pages of a mapped file are shared by every process
+#that maps it, so numeric and categorical columns cost their memory once per box instead of once per worker
+
+def write_frame(frame, path):
+    os.makedirs(path)
+    columns = []
+    for col in frame.columns:
+        values = frame[col]
+        if isinstance(values.array, (pd.arrays.IntegerArray, pd.arrays.FloatingArray, pd.arrays.BooleanArray)):
+            #nullable Int64 / Float64 / boolean: plain values plus the missing-value mask
+            np.save(os.path.join(path, f'{len(columns)}.npy'), values.to_numpy(dtype=values.dtype.numpy_dtype, na_value=0))
+            np.save(os.path.join(path, f'{len(columns)}.mask.npy'), values.isna().to_numpy())
+            columns.append({'name': col, 'kind': 'masked', 'dtype': str(values.dtype)})
+        elif pd.api.types.is_numeric_dtype(values.dtype) and not isinstance(values.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(path, f'{len(columns)}.npy'), values.to_numpy())
+            columns.append({'name': col, 'kind': 'array'})
+        else:
+            #sorted labels, so sorting the codes (or the categorical) sorts the text
+            codes, labels = pd.factorize(values, sort=True)
+            #smallest code type that fits, which is also what pandas uses for categoricals, so they map without a copy
+            code_type = np.int8 if len(labels) < 2**7 else np.int16 if len(labels) < 2**15 else np.int32
+            np.save(os.path.join(path, f'{len(columns)}.npy'), codes.astype(code_type))
+            np.save(os.path.join(path, f'{len(columns)}.labels.npy'), np.asarray(labels, dtype=str))
+            columns.append({'name': col, 'kind': 'text'})
+    with open(os.path.join(path, 'columns.json'), 'w') as f:
+        json.dump(columns, f)
+
+def read_frame(path, text='str'):
+    #text='category' keeps text columns as categoricals over the mapped codes (no copy), text='str' decodes them
+    with open(os.path.join(path, 'columns.json')) as f:
+        columns = json.load(f)
+    data = {}
+    for i, col in enumerate(columns):
+        values = np.load(os.path.join(path, f'{i}.npy'), mmap_mode='r')
+        if col['kind'] == 'masked':
+            mask = np.load(os.path.join(path, f'{i}.mask.npy'), mmap_mode='r')
+            values = pd.api.types.pandas_dtype(col['dtype']).construct_array_type()(values, mask)
+        elif col['kind'] == 'text':
+            labels = np.load(os.path.join(path, f'{i}.labels.npy')).astype(object)
+            values = pd.Categorical.from_codes(values, labels)
+            if text == 'str':
+                values = values.astype(object)
+        data[col['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+def read_manifest():
+    try:
+        with open(os.path.join(SNAPSHOT_DIR, 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_manifest(manifest):
+    tmp = os.path.join(SNAPSHOT_DIR, f'manifest.json.{os.getpid()}')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, os.path.join(SNAPSHOT_DIR, 'manifest.json'))
+
+def publish_snapshot(f1_data, laps, sources, **manifest):
+    #write the frames as the snapshot of `sources` and point the manifest at it. extra manifest fields (ingest.py
+    #records the seasons it changed) tell running workers what to rebuild when they switch to it
+    version = dataset_version(sources)
+    target = os.path.join(SNAPSHOT_DIR, version)
+    if not os.path.isdir(target):
+        #write next to the target and rename, so workers starting at the same time never see half a snapshot
+        tmp = os.path.join(SNAPSHOT_DIR, f'.{version}.{os.getpid()}')
+        shutil.rmtree(tmp, ignore_errors=True)
+        write_frame(f1_data, os.path.join(tmp, 'f1_data'))
+        write_frame(laps, os.path.join(tmp, 'laps'))
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            #another process finished the same version first
+            shutil.rmtree(tmp, ignore_errors=True)
+    write_manifest(dict(manifest, version=version, format=SNAPSHOT_FORMAT, sources=sources))
+    #drop versions older than the previous one; workers still on the previous version keep loading it until they switch
+    keep = (version, manifest.get('previous'), 'manifest.json')
+    for name in os.listdir(SNAPSHOT_DIR):
+        if name not in keep and not name.startswith('.') and os.path.isdir(os.path.join(SNAPSHOT_DIR, name)):
+            shutil.rmtree(os.path.join(SNAPSHOT_DIR, name), ignore_errors=True)
+    return version
+
+def build_snapshot(sources=None):
+    sources = sources or source_fingerprints()
+    if os.path.isdir(os.path.join(SNAPSHOT_DIR, dataset_version(sources))):
+        return publish_snapshot(None, None, sources)
+    f1_data, laps = read_csv_data()
+    return publish_snapshot(f1_data, laps, sources)
+
+def current_version():
+    #cheap check on size + mtime first, the hashes only when a source file was touched
+    manifest = read_manifest()
+    if manifest and manifest.get('format') == SNAPSHOT_FORMAT:
+        known = manifest['sources']
+        if all(path in known and {k: known[path][k] for k in ('size', 'mtime_ns')} == file_stat(path) for path in (DATA_CSV, LAPS_CSV)):
+            if os.path.isdir(os.path.join(SNAPSHOT_DIR, manifest['version'])):
+                return manifest['version']
+    sources = source_fingerprints()
+    version = dataset_version(sources)
+    if os.path.isdir(os.path.join(SNAPSHOT_DIR, version)):
+        write_manifest({'version': version, 'format': SNAPSHOT_FORMAT, 'sources': sources})
+        return version
+    return build_snapshot(sources)
+
+def load_data():
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    version = current_version()
+    path = os.path.join(SNAPSHOT_DIR, version)
+    #text columns stay categorical over the shared codes; group by them with observed=True
+    return read_frame(os.path.join(path, 'f1_data'), text='category'), read_frame(os.path.join(path, 'laps'), text='category'), version
+
+######################################################CLI###############################################################
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the binary snapshot of F1_data.csv and lap_times.csv')
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--force', action='store_true', help='rebuild even if the snapshot matches the CSV files')
+    args = parser.parse_args()
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    if args.force:
+        shutil.rmtree(os.path.join(SNAPSHOT_DIR, dataset_version(source_fingerprints())), ignore_errors=True)
+    print(f'snapshot {build_snapshot()} written to {SNAPSHOT_DIR}/')
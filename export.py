@@ -0,0 +1,170 @@
+import hashlib
+import importlib.util
+import os
+import threading
+
+import flask
+
+#rows encoded per chunk of a download; a chunk is written to the socket before the next one is encoded
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', 20000))
+#most rows one request can ask for with ?limit= (0: no cap)
+EXPORT_MAX_ROWS = int(os.environ.get('EXPORT_MAX_ROWS', 0))
+#bump when the encoding below changes, so clients do not resume a download against differently encoded bytes
+EXPORT_FORMAT = 1
+
+MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson', 'parquet': 'application/vnd.apache.parquet'}
+
+######################################################Encoders##########################################################
+
+def chunks(frame, size):
+    for start in range(0, len(frame), size):
+        yield frame.iloc[start:start + size]
+
+def csv_chunks(frame, size):
+    yield frame.iloc[:0].to_csv(index=False, lineterminator='\n').encode()
+    for chunk in chunks(frame, size):
+        yield chunk.to_csv(index=False, header=False, lineterminator='\n').encode()
+
+def jsonl_chunks(frame, size):
+    for chunk in chunks(frame, size):
+        text = chunk.to_json(orient='records', lines=True)
+        yield (text if text.endswith('\n') else text + '\n').encode()
+
+class Drain:
+    #write-only file for pyarrow that hands over what was written since the last take(); tell() keeps counting from the
+    #start of the file, which the parquet footer offsets are based on
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+def parquet_chunks(frame, size):
+    #one row group per chunk
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.Schema.from_pandas(frame.iloc[:0], preserve_index=False)
+    drain = Drain()
+    writer = pq.ParquetWriter(pa.PythonFile(drain, mode='w'), schema)
+    for chunk in chunks(frame, size):
+        writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        yield drain.take()
+    writer.close()
+    yield drain.take()
+
+ENCODERS = {'csv': csv_chunks, 'jsonl': jsonl_chunks, 'parquet': parquet_chunks}
+
+def parquet_available():
+    return importlib.util.find_spec('pyarrow') is not None
+
+######################################################Ranges############################################################
+
+def byte_range(parts, start, stop):
+    #the bytes [start, stop) of a chunk stream, encoding (but not sending) what comes before start
+    position = 0
+    for part in parts:
+        end = position + len(part)
+        if end > start:
+            yield part[max(start - position, 0):stop - position]
+        position = end
+        if position >= stop:
+            break
+
+def counted(parts, lengths, etag, lock):
+    #pass the chunks through and remember the full length, so later Range requests for the same etag can be answered
+    total = 0
+    for part in parts:
+        total += len(part)
+        yield part
+    with lock:
+        if len(lengths) >= 10000:
+            lengths.clear()
+        lengths[etag] = total
+
+######################################################Flask#############################################################
+
+def register(server, views, current):
+    #/export/<view>?<params>&format=csv|jsonl|parquet&limit=N streams the rows behind a view. views maps a view name to
+    #(required params, function of (dataset, *params) returning a frame); current() returns the dataset being served,
+    #read once per request so the rows and the etag come from the same one.
+    #a download is encoded chunk by chunk, never as a whole. the etag is strong (same dataset, view, params, format and
+    #limit -> same bytes), so If-None-Match is answered with a 304 and a byte Range resumes a download once this worker
+    #has streamed that etag in full and knows its length; before that a Range is ignored and the whole file sent
+    lengths = {}
+    lengths_lock = threading.Lock()
+
+    @server.route('/export/<view>')
+    def export(view):
+        if view not in views:
+            flask.abort(404)
+        params, rows = views[view]
+        args = flask.request.args
+        fmt = args.get('format', 'csv')
+        if fmt not in ENCODERS:
+            flask.abort(400)
+        if fmt == 'parquet' and not parquet_available():
+            flask.abort(501)
+        dataset = current()
+        try:
+            limit = int(args['limit']) if 'limit' in args else None
+            values = [args[name] for name in params]
+            frame = rows(dataset, *values)
+        except (KeyError, ValueError):
+            flask.abort(400)
+        if EXPORT_MAX_ROWS:
+            limit = min(limit, EXPORT_MAX_ROWS) if limit is not None else EXPORT_MAX_ROWS
+        if limit is not None:
+            frame = frame.iloc[:max(limit, 0)]
+
+        key = '\n'.join([dataset.data_version, str(EXPORT_FORMAT), view, fmt, str(limit)] + values)
+        etag = hashlib.sha1(key.encode()).hexdigest()[:20]
+        if flask.request.if_none_match.contains(etag):
+            response = flask.Response(status=304)
+            response.set_etag(etag)
+            return response
+
+        parts = ENCODERS[fmt](frame, EXPORT_CHUNK_ROWS)
+        filename = '-'.join([view] + values).replace(' ', '_').replace('"', '')
+        headers = {'Content-Disposition': f'attachment; filename="{filename}.{fmt}"', 'Accept-Ranges': 'bytes'}
+        requested = flask.request.range
+        with lengths_lock:
+            length = lengths.get(etag)
+        #If-Range: only resume a download of the same bytes
+        if_range = flask.request.if_range
+        if (requested and length is not None and len(requested.ranges) == 1
+                and ('If-Range' not in flask.request.headers or if_range.etag == etag)):
+            span = requested.range_for_length(length)
+            if span is None:
+                response = flask.Response(status=416, headers={'Content-Range': f'bytes */{length}'})
+                response.set_etag(etag)
+                return response
+            start, stop = span
+            response = flask.Response(byte_range(parts, start, stop), status=206, mimetype=MIMETYPES[fmt], headers=headers)
+            response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{length}'
+            response.content_length = stop - start
+        else:
+            response = flask.Response(counted(parts, lengths, etag, lengths_lock), mimetype=MIMETYPES[fmt], headers=headers)
+            if length is not None:
+                response.content_length = length
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = 3600
+        return response
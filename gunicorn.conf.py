@@ -0,0 +1,46 @@
+import gc
+import os
+import sys
+
+#gunicorn reads this file automatically when started from the repo root (see Procfile)
+
+#load app.py (data, indexes, aggregates, lap records) once in the master and fork the workers from it, so they all
+#start from the same pages instead of each building a private copy. F1DASH_PRELOAD=0 goes back to one load per worker
+preload_app = os.environ.get('F1DASH_PRELOAD', '1') == '1'
+
+def cli_worker_class():
+    #-k / --worker-class from the command line or GUNICORN_CMD_ARGS; this file runs before they are applied
+    args = os.environ.get('GUNICORN_CMD_ARGS', '').split() + sys.argv[1:]
+    found = None
+    for i, arg in enumerate(args):
+        if arg in ('-k', '--worker-class') and i + 1 < len(args):
+            found = args[i + 1]
+        elif arg.startswith('--worker-class='):
+            found = arg.split('=', 1)[1]
+        elif arg.startswith('-k') and len(arg) > 2:
+            found = arg[2:]
+    return found
+
+#gevent workers patch the standard library when they boot, which is after the preloaded app has created its locks
+#(caches, metrics) and those stay real thread locks: a greenlet waiting on one blocks every other greenlet of the
+#worker, including the one holding it. patching here, before the app is loaded, makes them gevent locks
+if preload_app and 'gevent' in (cli_worker_class() or ''):
+    from gevent import monkey
+    monkey.patch_all()
+
+#a preloaded app is imported in the master, where app.py must not start its warmup thread: a worker forked while the
+#thread holds a lock (metrics, caches) inherits it held and hangs on its first callback. the warmup runs in when_ready
+#instead, before the workers exist, and they inherit what it rendered
+memo_warmup = os.environ.pop('MEMO_WARMUP', None) if preload_app else None
+
+def when_ready(server):
+    #runs in the master after the app is loaded and before any worker is forked. objects that exist now live for the
+    #whole process; freezing them keeps the cyclic collector from writing to their pages, so the pages stay shared
+    if memo_warmup:
+        import app
+        from memo import warmup
+        server.log.info('memo warmup: %s', warmup(app, full=memo_warmup == 'full'))
+        #each worker counts its own requests from zero
+        app.metrics.registry.reset()
+        app.memo.cache.reset_counts()
+    gc.freeze()
@@ -0,0 +1,78 @@
+import functools
+
+import numpy as np
+import pandas as pd
+
+######################################################Index#############################################################
+
+class HeadToHead:
+    #each driver's entries as (sorted raceIds, row positions); the races two careers share are the intersection of two
+    #sorted arrays, not a merge of filtered frames
+
+    def __init__(self, f1_data, driver_index, touched=None, previous=None, moved=None):
+        #with the index of the snapshot before (`previous`) only the drivers in `touched` are sorted again; the others
+        #keep their raceIds, their rows renumbered through `moved` (old row -> new row)
+        race_ids = f1_data['raceId'].to_numpy()
+        self.entries = {}
+        for name, rows in driver_index.items():
+            if previous is not None and name not in touched and name in previous.entries:
+                races, old_rows = previous.entries[name]
+                self.entries[name] = (races, moved[old_rows])
+                continue
+            order = np.argsort(race_ids[rows], kind='stable')
+            self.entries[name] = (race_ids[rows][order], rows[order])
+        self.year = f1_data['year'].to_numpy()
+        self.circuit = f1_data['circuit'].astype(str).to_numpy()
+        self.position = f1_data['position'].astype('float64').to_numpy()
+        self.grid = f1_data['grid'].to_numpy()
+        self.points = f1_data['points'].to_numpy()
+        self.fastest = f1_data['fastest_lap_ms'].astype('float64').to_numpy()
+        self.status = f1_data['status'].astype(str).to_numpy()
+        self.compare = functools.lru_cache(maxsize=4096)(self.compare)
+
+    def shared_rows(self, names):
+        #row positions of every driver in the races all of them entered, aligned race by race
+        races, rows = self.entries[names[0]]
+        aligned = [rows]
+        for name in names[1:]:
+            other_races, other_rows = self.entries[name]
+            races, mine, theirs = np.intersect1d(races, other_races, return_indices=True)
+            aligned = [r[mine] for r in aligned] + [other_rows[theirs]]
+        return races, aligned
+
+    def compare(self, names):
+        #shared races of a tuple of names (cached per tuple), deltas against the first name
+        names = tuple(name for name in names if name in self.entries)
+        if len(names) < 2:
+            return None
+        races, aligned = self.shared_rows(names)
+        positions = np.array([self.position[rows] for rows in aligned])
+        #best classified finisher of each race (unclassified count as behind everyone)
+        ranked = np.where(np.isnan(positions), np.inf, positions)
+        best = (ranked == ranked.min(axis=0)) & np.isfinite(ranked)
+        ahead = best & (best.sum(axis=0) == 1)
+
+        #grid 0 is a pit lane start
+        grids = np.array([self.grid[rows] for rows in aligned], dtype=float)
+        grids[grids == 0] = np.nan
+        base = aligned[0]
+        drivers = []
+        for i, (name, rows) in enumerate(zip(names, aligned)):
+            grid, base_grid = grids[i], grids[0]
+            fastest_delta = self.fastest[rows] - self.fastest[base]
+            dnf = pd.Series(self.status[rows][np.isnan(self.position[rows])]).value_counts()
+            drivers.append({
+                'name': name,
+                'ahead': int(ahead[i].sum()),
+                'points': round(float(self.points[rows].sum()), 1),
+                'mean_grid': None if np.isnan(grid).all() else round(float(np.nanmean(grid)), 2),
+                'grid_delta': None if np.isnan(grid - base_grid).all() else round(float(np.nanmean(grid - base_grid)), 2),
+                'fastest_lap_delta_ms': None if np.isnan(fastest_delta).all() else int(np.nanmean(fastest_delta)),
+                'dnf': {status: int(n) for status, n in dnf.items()},
+                'positions': [None if np.isnan(p) else int(p) for p in positions[i]],
+            })
+        return {
+            'races': [f'{self.year[row]} {self.circuit[row]}' for row in base],
+            'shared': len(races),
+            'drivers': drivers,
+        }
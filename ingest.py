@@ -0,0 +1,96 @@
+import argparse
+import os
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from data import (DATA_CSV, LAPS_CSV, SNAPSHOT_DIR, current_version, lap_time_ms, normalize, publish_snapshot, read_frame,
+                  source_fingerprints)
+
+#append new race results (and their lap times) to the csv files and publish the next snapshot without re-reading the
+#csv files: the current snapshot plus the new rows is the new snapshot. running workers see the new version in the
+#manifest and swap it in (see reload_data in app.py), rebuilding only the seasons listed as changed.
+#
+#    python ingest.py results.csv [--laps laps.csv]
+#
+#results.csv has the columns of F1_data.csv; total_points, wins, full_name and the index column can be left out.
+
+######################################################Derived columns###################################################
+
+def plain_name(forename, surname):
+    #full_name in F1_data.csv is written without accents ('Kimi Raikkonen')
+    name = unicodedata.normalize('NFKD', f'{forename} {surname}')
+    return ''.join(c for c in name if not unicodedata.combining(c))
+
+def running_totals(new_rows, f1_data):
+    #total_points / wins after each new row: what the driver had in that season before the new rounds, plus a cumsum
+    #over the new rows. only (year, driver) pairs in new_rows are looked at
+    new_rows = new_rows.sort_values(by=['year', 'round'], kind='mergesort')
+    pairs = pd.MultiIndex.from_frame(new_rows[['year', 'driverId']])
+    known = f1_data[pd.MultiIndex.from_frame(f1_data[['year', 'driverId']]).isin(pairs)]
+    first_new_round = new_rows.groupby(['year', 'driverId'])['round'].min()
+    later = known.join(first_new_round.rename('first_new_round'), on=['year', 'driverId'])
+    if (later['round'] >= later['first_new_round']).any():
+        raise SystemExit('new rows come before rounds already in the data; rebuild from the csv files instead')
+
+    last = known.sort_values(by='round', kind='mergesort').groupby(['year', 'driverId'])[['total_points', 'wins']].last()
+    before = new_rows[['year', 'driverId']].join(last, on=['year', 'driverId']).fillna(0)
+    won = (pd.to_numeric(new_rows['position'], errors='coerce') == 1).astype(int)
+    group = [new_rows['year'], new_rows['driverId']]
+    new_rows['total_points'] = before['total_points'] + new_rows['points'].fillna(0).groupby(group).cumsum()
+    new_rows['wins'] = (before['wins'] + won.groupby(group).cumsum()).astype(int)
+    return new_rows
+
+######################################################Ingest############################################################
+
+def ingest(results_path, laps_path=None):
+    previous = current_version()
+    path = os.path.join(SNAPSHOT_DIR, previous)
+    f1_data = read_frame(os.path.join(path, 'f1_data'))
+    laps = read_frame(os.path.join(path, 'laps'))
+    columns = pd.read_csv(DATA_CSV, nrows=0).columns
+
+    new_rows = pd.read_csv(results_path)
+    if 'full_name' not in new_rows:
+        new_rows['full_name'] = [plain_name(forename, surname) for forename, surname in zip(new_rows['forename'], new_rows['surname'])]
+    key = ['raceId', 'driverId']
+    seen = pd.MultiIndex.from_frame(f1_data[key])
+    new_rows = new_rows[~pd.MultiIndex.from_frame(new_rows[key]).isin(seen)]
+    if not len(new_rows):
+        return previous, []
+    new_rows = running_totals(new_rows, f1_data)
+    new_rows[columns[0]] = np.arange(len(new_rows)) + int(f1_data[columns[0]].max()) + 1
+
+    new_laps = pd.read_csv(laps_path) if laps_path else pd.DataFrame(columns=pd.read_csv(LAPS_CSV, nrows=0).columns)
+    new_laps = new_laps[pd.MultiIndex.from_frame(new_laps[key]).isin(pd.MultiIndex.from_frame(new_rows[key]))]
+
+    #csv files first: they stay the source of truth a full rebuild starts from
+    new_rows[columns].to_csv(DATA_CSV, mode='a', header=False, index=False)
+    if len(new_laps):
+        new_laps.to_csv(LAPS_CSV, mode='a', header=False, index=False)
+
+    #the same steps read_csv_data runs, on the new rows only
+    new_rows = normalize(new_rows[columns].copy()).sort_values(by='forename', kind='mergesort')
+    new_laps = pd.merge(new_laps, new_rows[['circuit','full_name','raceId','driverId','year','fastestLapSpeed','fastestLapTime']], on=key)
+    new_laps['time_ms'] = lap_time_ms(new_laps['time'].astype(str))
+
+    f1_data = pd.concat([f1_data, new_rows[f1_data.columns]], ignore_index=True)
+    f1_data = f1_data.sort_values(by=['year','round'], kind='mergesort').reset_index(drop=True)
+    laps = pd.concat([laps, new_laps[laps.columns]], ignore_index=True)
+
+    changed_years = sorted(int(year) for year in new_rows['year'].unique())
+    version = publish_snapshot(f1_data, laps, source_fingerprints(), previous=previous, changed_years=changed_years)
+    return version, changed_years
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Append race results to the dataset and publish a new snapshot')
+    parser.add_argument('results', help='csv with the columns of F1_data.csv')
+    parser.add_argument('--laps', help='csv with the columns of lap_times.csv for the same races')
+    args = parser.parse_args()
+
+    version, changed_years = ingest(args.results, args.laps)
+    if changed_years:
+        print(f'snapshot {version} published, seasons changed: {", ".join(map(str, changed_years))}')
+    else:
+        print(f'nothing new, snapshot {version} unchanged')
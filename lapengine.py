@@ -0,0 +1,90 @@
+import numpy as np
+
+######################################################Engine############################################################
+
+def segments(keys):
+    #start of every run of equal keys in a sorted array, and the length of each run
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return starts, np.diff(np.r_[starts, len(keys)])
+
+def decimate(n, max_points):
+    #indices of at most `max_points` evenly spread samples of n, first and last always kept
+    if n <= max_points:
+        return np.arange(n)
+    return np.unique(np.linspace(0, n - 1, max_points).round().astype(np.intp))
+
+class LapEngine:
+    #every lap of every race as flat arrays sorted by (raceId, driverId, lap); a race is one contiguous slice
+
+    def __init__(self, laps, race_ids=None, previous=None):
+        #with the engine of the snapshot before (`previous`) only the laps of `race_ids` are sorted again; the other
+        #races keep their (already sorted) rows
+        if previous is not None:
+            laps = laps[laps['raceId'].isin(list(race_ids))]
+        race = laps['raceId'].to_numpy()
+        driver = laps['driverId'].to_numpy()
+        lap = laps['lap'].to_numpy()
+        order = np.lexsort((lap, driver, race))
+        self.race = np.ascontiguousarray(race[order], dtype=np.int32)
+        self.driver = np.ascontiguousarray(driver[order], dtype=np.int32)
+        self.lap = np.ascontiguousarray(lap[order], dtype=np.int32)
+        self.ms = np.ascontiguousarray(laps['milliseconds'].to_numpy()[order], dtype=np.int64)
+        names = laps[['driverId', 'full_name']].drop_duplicates('driverId')
+        self.names = dict(zip(names['driverId'].tolist(), names['full_name'].astype(str).tolist()))
+        if previous is not None:
+            keep = ~np.isin(previous.race, list(race_ids))
+            #a stable sort on the race alone keeps every race's rows in (driverId, lap) order
+            race = np.concatenate([previous.race[keep], self.race])
+            order = np.argsort(race, kind='stable')
+            self.race = race[order]
+            for name in ('driver', 'lap', 'ms'):
+                setattr(self, name, np.concatenate([getattr(previous, name)[keep], getattr(self, name)])[order])
+            self.names = {**previous.names, **self.names}
+        starts, counts = segments(self.race)
+        self.races = {int(r): slice(start, start + count) for r, start, count in zip(self.race[starts], starts, counts)}
+
+    def race_trace(self, race_id, max_points=60):
+        #per driver (finishing order): decimated lap numbers, position and gap to the leader (s) at the end of each
+        #lap, and the quartiles of their lap times (s). None when the race has no lap data
+        rows = self.races.get(race_id)
+        if rows is None:
+            return None
+        driver, lap, ms = self.driver[rows], self.lap[rows], self.ms[rows]
+
+        #race time at the end of every lap: one cumsum over the race, minus what came before each driver's first lap
+        starts, counts = segments(driver)
+        total = np.cumsum(ms)
+        elapsed = total - np.repeat(total[starts] - ms[starts], counts)
+
+        #position and leader on every lap: sort by (lap, race time), rank within each lap
+        by_lap = np.lexsort((elapsed, lap))
+        lap_starts, lap_counts = segments(lap[by_lap])
+        position = np.empty(len(lap), dtype=np.int32)
+        position[by_lap] = np.arange(len(lap)) - np.repeat(lap_starts, lap_counts) + 1
+        leader = np.zeros(lap.max() + 1, dtype=np.int64)
+        leader[lap[by_lap[lap_starts]]] = elapsed[by_lap[lap_starts]]
+        gap = elapsed - leader[lap]
+
+        #finishing order: most laps first, then lowest race time
+        ends = starts + counts - 1
+        finish = np.lexsort((elapsed[ends], -counts))
+
+        drivers = []
+        for i in finish:
+            start, count = starts[i], counts[i]
+            keep = start + decimate(count, max_points)
+            seconds = ms[start:start + count] / 1000
+            q1, median, q3 = np.percentile(seconds, [25, 50, 75]).tolist()
+            iqr = q3 - q1
+            drivers.append({
+                'name': self.names.get(int(driver[start]), str(driver[start])),
+                'laps': lap[keep].tolist(),
+                'position': position[keep].tolist(),
+                'gap': (gap[keep] / 1000).round(3).tolist(),
+                'lap_times': {
+                    'q1': round(q1, 3), 'median': round(median, 3), 'q3': round(q3, 3),
+                    'lowerfence': round(float(seconds[seconds >= q1 - 1.5 * iqr].min()), 3),
+                    'upperfence': round(float(seconds[seconds <= q3 + 1.5 * iqr].max()), 3),
+                },
+            })
+        return {'race_id': race_id, 'laps': int(lap.max()), 'drivers': drivers}
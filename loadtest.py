@@ -0,0 +1,273 @@
+import argparse
+import http.client
+import importlib.util
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import memreport
+import wikistub
+from bench import OUTPUTS, dash_payload, summarize
+
+#load test of the app under gunicorn: starts it once per worker configuration (worker class, workers, threads) with
+#wikipedia replaced by wikistub.py, and has N simulated users replay dashboard sessions against
+#/_dash-update-component for a fixed time. reports throughput, latency percentiles and the memory of every worker.
+#
+#    python loadtest.py --configs sync:4,gthread:2x4,gevent:4 --users 16 --duration 30 --json load.json
+
+DEFAULT_CONFIGS = 'sync:1,sync:4,gthread:2x4,gthread:4x4,gevent:4'
+
+######################################################Sessions##########################################################
+
+def scrub_session(app, rng):
+    #dragging the year slider: a run of neighbouring years, each one a plots update
+    years = sorted(app.state.year_index)
+    start = rng.randrange(len(years))
+    step = rng.choice([-1, 1])
+    run = [years[i] for i in range(start, start + step * rng.randint(5, 20), step) if 0 <= i < len(years)]
+    return [('plots', (year,)) for year in run]
+
+def gp_session(app, rng):
+    #one season on the grand prix tab, switching between several of its races
+    year = rng.choice(sorted(app.state.year_index))
+    gps = app.state.all_circuit_options[year]
+    steps = []
+    for gp in rng.sample(gps, min(len(gps), rng.randint(3, 8))):
+        steps += [('circuit_info', (year, gp)), ('circuit_map', (gp,)), ('race_analysis', (year, gp)), ('circuit_trends', (gp,))]
+    return steps
+
+def driver_session(app, rng):
+    #browsing the drivers of a season, then comparing two of them
+    year = rng.choice(sorted(app.state.year_index))
+    names = app.state.driver_options[year]
+    picked = rng.sample(names, min(len(names), rng.randint(3, 6)))
+    steps = []
+    for name in picked:
+        steps += [('driver_info', (name,)), ('driver_media', (name,))]
+    if len(picked) > 1:
+        steps.append(('head_to_head', (picked[:2],)))
+    return steps
+
+SESSIONS = {'scrub': scrub_session, 'gp': gp_session, 'drivers': driver_session}
+
+######################################################Server############################################################
+
+def parse_config(spec):
+    #'sync:4' -> 4 sync workers, 'gthread:2x8' -> 2 workers with 8 threads each
+    worker_class, _, size = spec.partition(':')
+    workers, _, threads = (size or '1').partition('x')
+    return {'name': spec, 'worker_class': worker_class, 'workers': int(workers), 'threads': int(threads or 1)}
+
+def worker_class_available(worker_class):
+    if worker_class == 'gevent':
+        return importlib.util.find_spec('gevent') is not None
+    return True
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(config, port, env, log):
+    command = [sys.executable, '-m', 'gunicorn', 'app:server', '--bind', f'127.0.0.1:{port}',
+               '--worker-class', config['worker_class'], '--workers', str(config['workers']),
+               '--threads', str(config['threads']), '--timeout', '120']
+    #from the repo root, where gunicorn finds gunicorn.conf.py and the app finds its data
+    #its own process group, so stop_server can take down workers that no longer answer the master
+    process = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT,
+                               cwd=os.path.dirname(os.path.abspath(__file__)), start_new_session=True)
+    #ready once the layout is served; the workers are forked from the preloaded app (gunicorn.conf.py)
+    deadline = time.time() + 180
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with {process.returncode}, see {log.name}')
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/_dash-layout')
+            if connection.getresponse().status == 200:
+                return process
+        except OSError:
+            pass
+        time.sleep(0.5)
+    stop_server(process)
+    raise RuntimeError(f'gunicorn did not answer within 180s, see {log.name}')
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(30)
+    except subprocess.TimeoutExpired:
+        pass
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        pass
+    process.wait()
+
+######################################################Load##############################################################
+
+def user(app, port, seed, stop_at, think, mix, samples):
+    #one simulated user: a keep-alive connection replaying random sessions until stop_at
+    rng = random.Random(seed)
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    while time.time() < stop_at:
+        session = rng.choices(names, weights)[0]
+        for callback, args in SESSIONS[session](app, rng):
+            if time.time() >= stop_at:
+                break
+            body = json.dumps(dash_payload(app.app, OUTPUTS[callback], args))
+            start = time.perf_counter()
+            try:
+                connection.request('POST', '/_dash-update-component', body, {'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                size = len(response.read())
+                ok = response.status in (200, 204)
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                ok, size = False, 0
+            samples.append((session, callback, time.perf_counter() - start, ok, size))
+            if think:
+                time.sleep(rng.expovariate(1 / think))
+    connection.close()
+
+def run_config(app, config, users, duration, warmup, think, mix, env, workdir):
+    port = free_port()
+    #fresh caches per configuration, so every one starts equally cold
+    path = os.path.join(workdir, config['name'].replace(':', '-'))
+    env = dict(env, MEMO_DIR=os.path.join(path, 'memo_cache'), METRICS_DIR=os.path.join(path, 'metrics'),
+               WIKI_CACHE_DIR=os.path.join(path, 'wiki_cache'))
+    with open(f'{path}.log', 'w') as log:
+        process = start_server(config, port, env, log)
+        try:
+            phases = {}
+            for number, (phase, seconds) in enumerate((('warmup', warmup), ('measure', duration))):
+                if not seconds:
+                    continue
+                samples = []
+                stop_at = time.time() + seconds
+                #other seeds while measuring, so the measured sessions are not the warmup's memoized ones again
+                threads = [threading.Thread(target=user, args=(app, port, number * users + i, stop_at, think, mix, samples))
+                           for i in range(users)]
+                start = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                phases[phase] = (samples, time.perf_counter() - start)
+            memory = memreport.report(process.pid)
+        finally:
+            stop_server(process)
+
+    samples, elapsed = phases['measure']
+    ok = [s for s in samples if s[3]]
+    workers = [row for row in memory['processes'] if row['role'] == 'worker']
+    mb = lambda n: round(n / 2**20, 1)
+    return {
+        'config': config,
+        'users': users,
+        'requests': len(samples),
+        'errors': len(samples) - len(ok),
+        'throughput_rps': round(len(ok) / elapsed, 1),
+        'latency': summarize([s[2] for s in ok]),
+        'callbacks': {name: summarize([s[2] for s in ok if s[1] == name]) for name in sorted({s[1] for s in ok})},
+        'sessions': {name: summarize([s[2] for s in ok if s[0] == name]) for name in sorted({s[0] for s in ok})},
+        'mean_bytes': int(np.mean([s[4] for s in ok])) if ok else 0,
+        'memory_mb': {
+            'master_rss': mb(memory['processes'][0]['Rss']),
+            'worker_rss': [mb(row['Rss']) for row in workers],
+            'worker_pss': [mb(row['Pss']) for row in workers],
+            'worker_private': [mb(row['Private_Clean'] + row['Private_Dirty']) for row in workers],
+            'total_pss': mb(memory['total']['Pss']),
+        },
+    }
+
+def run(configs, users=16, duration=30, warmup=5, think=0.0, mix=None, memo=True, wiki_delay=0.0):
+    workdir = tempfile.mkdtemp(prefix='f1load-')
+    stub, url = wikistub.start(delay=wiki_delay)
+    env = dict(os.environ, WIKI_API=url, MEMO='1' if memo else '0', DATA_RELOAD_INTERVAL='0')
+    env.pop('MEMO_WARMUP', None)
+    #the load generator builds its payloads from the same app (callback map, years, grand prix, drivers)
+    client = os.path.join(workdir, 'client')
+    os.environ.update(env, MEMO_DIR=os.path.join(client, 'memo_cache'), METRICS_DIR=os.path.join(client, 'metrics'),
+                      WIKI_CACHE_DIR=os.path.join(client, 'wiki_cache'))
+    import app
+
+    results = []
+    for config in configs:
+        if not worker_class_available(config['worker_class']):
+            print(f'{config["name"]}: skipped, {config["worker_class"]} is not installed', file=sys.stderr)
+            continue
+        print(f'{config["name"]}: {users} users, {duration}s ...', file=sys.stderr)
+        results.append(run_config(app, config, users, duration, warmup, think, mix or {name: 1 for name in SESSIONS}, env, workdir))
+
+    stub.shutdown()
+    #server logs are kept when something failed
+    if any(row['errors'] for row in results):
+        print(f'errors: gunicorn logs are in {workdir}', file=sys.stderr)
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        'meta': {
+            'users': users,
+            'duration': duration,
+            'warmup': warmup,
+            'think': think,
+            'mix': mix or {name: 1 for name in SESSIONS},
+            'memo': memo,
+            'wiki_delay': wiki_delay,
+            'data_version': app.state.data_version,
+            'cpus': os.cpu_count(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+def print_result(result):
+    meta = result['meta']
+    print(f'{meta["users"]} users, {meta["duration"]}s, think {meta["think"]}s, memo={meta["memo"]}, {meta["cpus"]} cpus')
+    print(f'{"config":<14}{"req/s":>8}{"errors":>8}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"worker pss":>12}{"total pss":>11}   (MB)')
+    for row in result['results']:
+        latency, memory = row['latency'], row['memory_mb']
+        worker_pss = round(float(np.mean(memory['worker_pss'])), 1) if memory['worker_pss'] else 0
+        if latency['count']:
+            print(f'{row["config"]["name"]:<14}{row["throughput_rps"]:>8}{row["errors"]:>8}{latency["p50_ms"]:>9}'
+                  f'{latency["p95_ms"]:>9}{latency["p99_ms"]:>9}{worker_pss:>12}{memory["total_pss"]:>11}')
+        else:
+            print(f'{row["config"]["name"]:<14}{0:>8}{row["errors"]:>8}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the dashboard under different gunicorn worker configurations')
+    parser.add_argument('--configs', default=DEFAULT_CONFIGS, help=f'comma separated class:workers[xthreads] (default {DEFAULT_CONFIGS})')
+    parser.add_argument('--users', type=int, default=16, help='simulated concurrent users')
+    parser.add_argument('--duration', type=float, default=30, help='seconds measured per configuration')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds of load before measuring (not reported)')
+    parser.add_argument('--think', type=float, default=0.0, help='mean seconds a user waits between updates (0: closed loop)')
+    parser.add_argument('--mix', default='scrub:1,gp:1,drivers:1', help='session weights, e.g. scrub:2,gp:1,drivers:1')
+    parser.add_argument('--no-memo', action='store_true', help='run the servers with callback memoization off')
+    parser.add_argument('--wiki-delay', type=float, default=0.0, help='seconds the wikipedia stub waits before answering')
+    parser.add_argument('--json', metavar='PATH', help='write the result as json')
+    args = parser.parse_args()
+
+    mix = {name: float(weight) for name, weight in (part.split(':') for part in args.mix.split(','))}
+    unknown = set(mix) - set(SESSIONS)
+    if unknown:
+        parser.error(f'unknown sessions: {", ".join(sorted(unknown))}')
+    configs = [parse_config(spec) for spec in args.configs.split(',')]
+    result = run(configs, args.users, args.duration, args.warmup, args.think, mix, not args.no_memo, args.wiki_delay)
+    print_result(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=1)
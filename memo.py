@@ -0,0 +1,147 @@
+import argparse
+import functools
+import json
+import os
+import shutil
+import threading
+import time
+
+import plotly.utils
+
+from cache import TTLCache
+from metrics import phase
+
+######################################################Settings##########################################################
+
+MEMO_DIR = os.environ.get('MEMO_DIR', 'memo_cache')
+#MEMO=0 turns memoization off (benchmarks of the callbacks themselves)
+MEMO_ENABLED = os.environ.get('MEMO', '1') != '0'
+#bump when a memoized callback changes what it returns, so stored responses from older code are not served
+MEMO_FORMAT = 4
+
+######################################################Memo##############################################################
+
+def plain(value):
+    #figures, numpy scalars etc. -> plain json values, encoded the same way dash encodes callback outputs
+    return json.loads(json.dumps(value, cls=plotly.utils.PlotlyJSONEncoder))
+
+def encode(name, value):
+    with phase(name, 'serialize'):
+        return plain(value)
+
+class CallbackMemo:
+    #callback outputs keyed on the callback name and its inputs, in memory and in a directory shared by every worker.
+    #the directory is per dataset version, so new data never sees old responses. current() returns the dataset being
+    #served; a memoized callback is called as fn(dataset, *inputs) with the dataset read once, and its response is
+    #stored under that dataset's version, so a swap in the middle of a request cannot mix two versions
+
+    def __init__(self, directory, current, max_memory=1024, max_disk=20000):
+        self.directory = directory
+        self.current = current
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self.lock = threading.Lock()
+        #version -> store, of the dataset being served and the one before it
+        self.caches = {}
+        self.version = f'{current().data_version}-{MEMO_FORMAT}'
+        self.cache_for(current().data_version)
+        self.functions = {}
+        self.prune()
+
+    @property
+    def cache(self):
+        #the store of the newest version
+        return self.caches[self.version]
+
+    def cache_for(self, data_version):
+        version = f'{data_version}-{MEMO_FORMAT}'
+        with self.lock:
+            cache = self.caches.get(version)
+            if cache is None:
+                cache = self.caches[version] = TTLCache(os.path.join(self.directory, version), None, self.max_memory,
+                                                        self.max_disk, serve_stale=False)
+            return cache
+
+    def prune(self, keep=()):
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name != self.version and name not in keep:
+                    shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def switch(self, data_version, keep=None):
+        #get the store of a new dataset version ready; call it before the new dataset is served. stored responses of
+        #the version being served for which keep(name, args) is true (the seasons they read did not change) are linked
+        #into the new directory instead of being recomputed. requests still bound to the old dataset keep using the
+        #old store, which stays until the next switch for them and for workers that have not swapped yet
+        serving = self.current().data_version
+        old_version = f'{serving}-{MEMO_FORMAT}'
+        old = self.cache_for(serving)
+        version = f'{data_version}-{MEMO_FORMAT}'
+        cache = TTLCache(os.path.join(self.directory, version), None, self.max_memory, self.max_disk, serve_stale=False)
+        carried = 0
+        if keep and os.path.isdir(old.directory):
+            os.makedirs(cache.directory, exist_ok=True)
+            for name in os.listdir(old.directory):
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(old.directory, name)) as f:
+                        fn, args = json.load(f)['key'].split(':', 1)
+                    if keep(fn, json.loads(args)):
+                        os.link(os.path.join(old.directory, name), os.path.join(cache.directory, name))
+                        carried += 1
+                except FileExistsError:
+                    carried += 1
+                except (OSError, ValueError, KeyError):
+                    pass
+        with self.lock:
+            self.caches = {old_version: old, version: cache}
+            self.version = version
+        self.prune(keep=(old_version,))
+        return carried
+
+    def __call__(self, fn):
+        if not MEMO_ENABLED:
+            @functools.wraps(fn)
+            def bound(*args):
+                return fn(self.current(), *args)
+            self.functions[fn.__name__] = bound
+            return bound
+
+        @functools.wraps(fn)
+        def memoized(*args):
+            dataset = self.current()
+            key = f'{fn.__name__}:{json.dumps(args, default=str)}'
+            return self.cache_for(dataset.data_version).get(key, lambda: encode(fn.__name__, fn(dataset, *args)))
+        self.functions[fn.__name__] = memoized
+        return memoized
+
+    def stats(self):
+        return self.cache.stats()
+
+######################################################Warmup############################################################
+
+def warmup(app, full=False):
+    #render every year (and with full=True every grand prix and driver) into the shared store
+    start = time.time()
+    calls = [(app.plots, (year,)) for year in app.state.year_index]
+    if full:
+        calls += [(app.circuit_info, key) for key in app.state.circuit_index]
+        calls += [(app.race_analysis, key) for key in app.state.circuit_index]
+        calls += [(app.driver_info, (name,)) for name in app.state.driver_index]
+    failed = 0
+    for fn, args in calls:
+        try:
+            fn(*args)
+        except Exception:
+            failed += 1
+    return {'calls': len(calls), 'failed': failed, 'seconds': round(time.time() - start, 2)}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pre-render dashboard callbacks into the shared memo store')
+    parser.add_argument('command', choices=['warmup'])
+    parser.add_argument('--full', action='store_true', help='also render every grand prix and every driver')
+    args = parser.parse_args()
+
+    import app
+    print(warmup(app, full=args.full))
@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+
+#resident / shared / private memory of a gunicorn master and its workers, read from /proc (linux only).
+#pss splits every shared page between the processes that map it, so the pss total is what the box really pays
+
+FIELDS = ['Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty', 'Swap']
+
+def smaps(pid):
+    usage = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0].rstrip(':') in FIELDS:
+                usage[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    return usage
+
+def children(pid):
+    found = []
+    for task in os.listdir(f'/proc/{pid}/task'):
+        try:
+            with open(f'/proc/{pid}/task/{task}/children') as f:
+                found += [int(child) for child in f.read().split()]
+        except OSError:
+            pass
+    return found
+
+def cmdline(pid):
+    with open(f'/proc/{pid}/cmdline', 'rb') as f:
+        return f.read().replace(b'\0', b' ').decode(errors='replace').strip()
+
+def is_gunicorn(pid):
+    #'gunicorn ...' or 'python .../gunicorn ...', not some wrapper that merely has it in its arguments
+    return any(os.path.basename(arg).startswith('gunicorn') for arg in cmdline(pid).split()[:2])
+
+def find_master():
+    #oldest gunicorn process whose parent is not gunicorn itself
+    masters = []
+    for pid in filter(str.isdigit, os.listdir('/proc')):
+        try:
+            if not is_gunicorn(pid):
+                continue
+            with open(f'/proc/{pid}/stat') as f:
+                ppid = f.read().rsplit(')', 1)[1].split()[1]
+            if not is_gunicorn(ppid):
+                masters.append(int(pid))
+        except OSError:
+            pass
+    return min(masters) if masters else None
+
+def report(master):
+    rows = [dict(pid=master, role='master', **smaps(master))]
+    rows += [dict(pid=pid, role='worker', **smaps(pid)) for pid in children(master)]
+    total = {field: sum(row.get(field, 0) for row in rows) for field in FIELDS}
+    return {'processes': rows, 'total': total}
+
+def print_report(result):
+    mb = lambda n: f'{n / 2**20:9.1f}'
+    print(f'{"pid":>8} {"role":<7}{"rss":>9}{"pss":>9}{"shared":>9}{"private":>9}   (MB)')
+    for row in result['processes']:
+        shared = row['Shared_Clean'] + row['Shared_Dirty']
+        private = row['Private_Clean'] + row['Private_Dirty']
+        print(f'{row["pid"]:>8} {row["role"]:<7}{mb(row["Rss"])}{mb(row["Pss"])}{mb(shared)}{mb(private)}')
+    total = result['total']
+    print(f'{"":>8} {"total":<7}{mb(total["Rss"])}{mb(total["Pss"])}{mb(total["Shared_Clean"] + total["Shared_Dirty"])}{mb(total["Private_Clean"] + total["Private_Dirty"])}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Memory used by a running gunicorn master and its workers')
+    parser.add_argument('pid', nargs='?', type=int, help='gunicorn master pid (found automatically when omitted)')
+    parser.add_argument('--json', action='store_true', help='print the report as json')
+    args = parser.parse_args()
+
+    master = args.pid or find_master()
+    if master is None:
+        parser.error('no running gunicorn master found')
+    result = report(master)
+    if args.json:
+        print(json.dumps(result, indent=1))
+    else:
+        print_report(result)
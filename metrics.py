@@ -0,0 +1,308 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+import flask
+
+######################################################Settings##########################################################
+
+#every worker writes its numbers here and /metrics adds up all of them, so any worker can answer a scrape
+METRICS_DIR = os.environ.get('METRICS_DIR', 'metrics')
+#METRICS_PROFILE=1 allows sampling a single request with the 'X-Profile: 1' header, written to PROFILE_DIR
+METRICS_PROFILE = os.environ.get('METRICS_PROFILE') == '1'
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+SECONDS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+HELP = {
+    'f1dash_callback_seconds': ('histogram', 'Callback run time, cache hits included', SECONDS),
+    'f1dash_callback_phase_seconds': ('histogram', 'Time spent in each phase of a callback', SECONDS),
+    'f1dash_request_seconds': ('histogram', 'Dash update requests, from request to response', SECONDS),
+    'f1dash_response_bytes': ('histogram', 'Size of dash update responses before compression', BYTES),
+    'f1dash_requests_total': ('counter', 'Dash update requests by status code', None),
+    'f1dash_cache_events_total': ('counter', 'Hits, misses and errors of the wikipedia and callback caches', None),
+}
+
+######################################################Registry##########################################################
+
+class Registry:
+    #counters and histograms of this process, as {(name, labels): value} with labels a sorted tuple of pairs
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        #callables returning {(name, labels): value} of counters kept elsewhere (cache stats)
+        self.collectors = []
+
+    def inc(self, name, value=1, **labels):
+        with self.lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        buckets = HELP[name][2]
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['buckets'][i] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: dict(h, buckets=list(h['buckets'])) for key, h in self.histograms.items()}
+        for collect in self.collectors:
+            counters.update(collect())
+        return {
+            'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+            'histograms': [[name, list(labels), h] for (name, labels), h in histograms.items()],
+        }
+
+registry = Registry()
+
+######################################################Instrumentation###################################################
+
+@contextmanager
+def phase(callback, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe('f1dash_callback_phase_seconds', time.perf_counter() - start, callback=callback, phase=name)
+
+#stopwatches started by the callback that is running on this thread, flushed by timed when it returns
+running = threading.local()
+
+class Stopwatch:
+    #lap timer for a callback body: stopwatch('select') adds the time since the previous lap to that phase. a phase
+    #lapped several times in one call is observed once, with its total, when the call ends (done(), which timed calls)
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.last = time.perf_counter()
+        self.phases = {}
+        stopwatches = getattr(running, 'stopwatches', None)
+        if stopwatches is not None:
+            stopwatches.append(self)
+
+    def __call__(self, name):
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0.0) + now - self.last
+        self.last = now
+
+    def done(self):
+        phases, self.phases = self.phases, {}
+        for name, seconds in phases.items():
+            registry.observe('f1dash_callback_phase_seconds', seconds, callback=self.callback, phase=name)
+
+def timed(fn):
+    #whole-callback time, and the phases of the stopwatches the callback started; put it above @memo so cache hits
+    #are counted too
+    @functools.wraps(fn)
+    def wrapper(*args):
+        start = time.perf_counter()
+        outer = getattr(running, 'stopwatches', None)
+        running.stopwatches = []
+        try:
+            return fn(*args)
+        finally:
+            registry.observe('f1dash_callback_seconds', time.perf_counter() - start, callback=fn.__name__)
+            for stopwatch in running.stopwatches:
+                stopwatch.done()
+            running.stopwatches = outer
+    return wrapper
+
+def cache_collector(cache_name, cache):
+    def collect():
+        stats = cache.stats()
+        return {('f1dash_cache_events_total', (('cache', cache_name), ('event', event))): value
+                for event, value in stats.items() if event != 'memory_entries'}
+    registry.collectors.append(collect)
+
+######################################################Exposition########################################################
+
+def snapshot_path(pid):
+    return os.path.join(METRICS_DIR, f'{pid}.json')
+
+def write_snapshot():
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        tmp = f'{snapshot_path(os.getpid())}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(registry.snapshot(), f)
+        os.replace(tmp, snapshot_path(os.getpid()))
+    except OSError:
+        pass
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def clean_snapshots():
+    #drop files left by processes that are gone (previous deploys); running workers keep theirs
+    if not os.path.isdir(METRICS_DIR):
+        return
+    for name in os.listdir(METRICS_DIR):
+        if name.endswith('.json') and name[:-5].isdigit() and not alive(int(name[:-5])):
+            try:
+                os.remove(os.path.join(METRICS_DIR, name))
+            except OSError:
+                pass
+
+def merged():
+    #this process live, every other worker from its last snapshot
+    snapshots = [registry.snapshot()]
+    if os.path.isdir(METRICS_DIR):
+        for name in os.listdir(METRICS_DIR):
+            if name.endswith('.json') and name != f'{os.getpid()}.json':
+                try:
+                    with open(os.path.join(METRICS_DIR, name)) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    pass
+    counters = defaultdict(float)
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            counters[(name, tuple(map(tuple, labels)))] += value
+        for name, labels, h in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            if key not in histograms:
+                histograms[key] = {'buckets': [0] * len(h['buckets']), 'sum': 0.0, 'count': 0}
+            histograms[key]['buckets'] = [a + b for a, b in zip(histograms[key]['buckets'], h['buckets'])]
+            histograms[key]['sum'] += h['sum']
+            histograms[key]['count'] += h['count']
+    return counters, histograms
+
+def label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in pairs) + '}'
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def render():
+    #prometheus text format
+    counters, histograms = merged()
+    lines = []
+    for name, (kind, text, buckets) in HELP.items():
+        if kind == 'counter':
+            series = sorted((labels, value) for (metric, labels), value in counters.items() if metric == name)
+        else:
+            series = sorted((labels, h) for (metric, labels), h in histograms.items() if metric == name)
+        if not series:
+            continue
+        lines.append(f'# HELP {name} {text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in series:
+            if kind == 'counter':
+                lines.append(f'{name}{label_text(labels)} {value:g}')
+                continue
+            running = 0
+            for bound, count in zip(buckets, value['buckets']):
+                running += count
+                lines.append(f'{name}_bucket{label_text(labels, [("le", f"{bound:g}")])} {running}')
+            lines.append(f'{name}_bucket{label_text(labels, [("le", "+Inf")])} {value["count"]}')
+            lines.append(f'{name}_sum{label_text(labels)} {value["sum"]:.6f}')
+            lines.append(f'{name}_count{label_text(labels)} {value["count"]}')
+    return '\n'.join(lines) + '\n'
+
+######################################################Profiler##########################################################
+
+class Sampler:
+    #samples the stack of one thread every `interval` seconds from a helper thread; folded stacks for flamegraph.pl
+
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f'{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def stop(self, path):
+        #number of samples; a profile that cannot be written is dropped rather than failing the request
+        self.running = False
+        self.thread.join()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                for stack, count in self.stacks.most_common():
+                    f.write(f'{stack} {count}\n')
+        except OSError:
+            return 0
+        return sum(self.stacks.values())
+
+######################################################Flask#############################################################
+
+def register(server):
+    clean_snapshots()
+    last_write = [0.0]
+
+    def callback_name(output_key):
+        #first output id of a dash update request, e.g. 'year_map'
+        return output_key.strip('.').split('...')[0].rsplit('.', 1)[0]
+
+    @server.before_request
+    def start_request():
+        flask.g.metrics_start = time.perf_counter()
+        if METRICS_PROFILE and flask.request.headers.get('X-Profile') == '1':
+            flask.g.sampler = Sampler(threading.get_ident())
+
+    @server.after_request
+    def finish_request(response):
+        if flask.request.path.endswith('/_dash-update-component'):
+            payload = flask.request.get_json(silent=True) or {}
+            output = callback_name(payload.get('output', ''))
+            registry.observe('f1dash_request_seconds', time.perf_counter() - flask.g.metrics_start, output=output)
+            registry.inc('f1dash_requests_total', output=output, status=response.status_code)
+            if not response.direct_passthrough:
+                registry.observe('f1dash_response_bytes', response.calculate_content_length() or 0, output=output)
+        sampler = flask.g.pop('sampler', None)
+        if sampler is not None:
+            path = os.path.join(PROFILE_DIR, f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{threading.get_ident()}.folded')
+            response.headers['X-Profile-Samples'] = str(sampler.stop(path))
+            response.headers['X-Profile-File'] = path
+        if time.time() - last_write[0] > 1:
+            last_write[0] = time.time()
+            write_snapshot()
+        return response
+
+    @server.route('/metrics')
+    def metrics():
+        return flask.Response(render(), mimetype='text/plain; version=0.0.4')
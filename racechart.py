@@ -0,0 +1,156 @@
+import json
+import os
+
+import flask
+import numpy as np
+import pandas as pd
+
+from data import SNAPSHOT_DIR
+
+#bump when the frames or the figure below change, so charts cached with an older layout are rebuilt
+RACECHART_FORMAT = 1
+
+######################################################Frames############################################################
+
+def race_frames(f1_data, entity, value='wins', top=10, start=0):
+    #cumulative wins (or points) of every driver/constructor after every race, as a (race x entity) matrix, and the
+    #`top` of each row from race `start` on. f1_data is sorted by year and round, so first appearance of a raceId is
+    #the race order
+    races, race_ids = pd.factorize(f1_data['raceId'])
+    entities, names = pd.factorize(f1_data[entity])
+    if value == 'wins':
+        amount = (f1_data['position'] == 1).fillna(False).to_numpy(dtype=np.float64)
+    else:
+        amount = f1_data[value].fillna(0).to_numpy(dtype=np.float64)
+
+    totals = np.zeros((len(race_ids), len(names)))
+    np.add.at(totals, (races, entities), amount)
+    np.cumsum(totals, axis=0, out=totals)
+    totals = totals[start:]
+
+    top = min(top, len(names))
+    best = np.argpartition(-totals, top - 1, axis=1)[:, :top]
+    best_totals = np.take_along_axis(totals, best, axis=1)
+    order = np.argsort(-best_totals, axis=1, kind='stable')
+    best = np.take_along_axis(best, order, axis=1)
+    best_totals = np.take_along_axis(best_totals, order, axis=1)
+
+    first = np.unique(races, return_index=True)[1]
+    first = first[start:]
+    labels = (f1_data['year'].to_numpy()[first].astype(str) + ' ' + f1_data['circuit'].astype(str).to_numpy()[first]).tolist()
+    frames = []
+    for label, row, row_totals in zip(labels, best, best_totals):
+        keep = row_totals > 0
+        row_totals = row_totals[keep].astype(int) if value == 'wins' else row_totals[keep].round(1)
+        frames.append({'label': label, 'names': [names[i] for i in row[keep]], 'totals': row_totals.tolist()})
+    return frames
+
+######################################################Figure############################################################
+
+def race_figure(frames, title, colors=None, default_color='#ff0000', frame_ms=80, first=0):
+    #animated horizontal bars (rank on the y axis, names as bar text) as a plain figure dict; go.Figure would validate
+    #every one of the ~1000 frames. `first` is the number of the first frame, when the ones before come from elsewhere
+    def bars(frame):
+        #frames only carry what changes; the rest of the trace comes from 'data'
+        trace = {'x': frame['totals'], 'y': list(range(len(frame['names']))), 'text': frame['names']}
+        if colors:
+            trace['marker'] = {'color': [colors.get(name, default_color) for name in frame['names']]}
+        return trace
+
+    def layout(frame):
+        return {
+            'title': {'text': f'{title} · {frame["label"]}', 'x': 0.5},
+            'xaxis': {'range': [0, max(frame['totals'] or [1]) * 1.05]},
+        }
+
+    play = {'frame': {'duration': frame_ms, 'redraw': True}, 'transition': {'duration': 0}, 'fromcurrent': True}
+    pause = {'frame': {'duration': 0, 'redraw': False}, 'mode': 'immediate', 'transition': {'duration': 0}}
+    last = frames[-1]
+    trace = dict(bars(last), type='bar', orientation='h', textposition='inside', insidetextanchor='start',
+                 hovertemplate='%{text}: %{x}<extra></extra>')
+    trace.setdefault('marker', {'color': default_color})
+    return {
+        'data': [trace],
+        'layout': dict(layout(last),
+                       yaxis={'autorange': 'reversed', 'visible': False},
+                       margin={'l': 10, 'r': 10, 'b': 30, 't': 50},
+                       height=300,
+                       showlegend=False,
+                       plot_bgcolor='#242e3f',
+                       paper_bgcolor='#242e3f',
+                       font={'color': 'white', 'size': 13},
+                       updatemenus=[{'type': 'buttons', 'direction': 'left', 'x': 1, 'y': 0, 'xanchor': 'right',
+                                     'yanchor': 'bottom', 'pad': {'r': 10, 'b': 10}, 'showactive': False,
+                                     'buttons': [{'label': '▶', 'method': 'animate', 'args': [None, play]},
+                                                 {'label': '❚❚', 'method': 'animate', 'args': [[None], pause]}]}]),
+        'frames': [{'name': str(i), 'data': [bars(frame)], 'layout': layout(frame)} for i, frame in enumerate(frames, first)],
+    }
+
+######################################################Cache#############################################################
+
+def race_charts(f1_data, version, colors=None, top=10, since=None, previous=None):
+    #driver and constructor win and points charts as encoded json, kept next to the snapshot of `version` so a new
+    #dataset gets new charts. with the charts of the snapshot before (`previous`) the frames of the races before the
+    #year `since` are taken from them and only the later ones are built
+    start = 0
+    if previous is not None:
+        #at least the last race is built, it also makes the figure's first view
+        start = min(f1_data.loc[f1_data['year'] < since, 'raceId'].nunique(), f1_data['raceId'].nunique() - 1)
+
+    def chart(name, entity, value, title, colors=None):
+        #the frames come last in the encoded figure, so the previous chart's first `start` frames are cut out of its
+        #json as they are and put in front of the new ones
+        head = b''
+        if start and name in previous:
+            old = previous[name]
+            begin = old.find(b'"frames":[') + len(b'"frames":[')
+            end = old.find(b',{"name":"%d",' % start, begin)
+            if begin >= len(b'"frames":[') and end >= 0:
+                head = old[begin:end + 1]
+        figure = race_figure(race_frames(f1_data, entity, value, top, start if head else 0), title, colors,
+                             first=start if head else 0)
+        encoded = json.dumps(figure, separators=(',', ':')).encode()
+        split = encoded.index(b'"frames":[') + len(b'"frames":[')
+        return encoded[:split] + head + encoded[split:]
+
+    builders = {
+        'drivers': lambda: chart('drivers', 'full_name', 'wins', 'Most race wins'),
+        'teams': lambda: chart('teams', 'constructor', 'wins', 'Most race wins by constructor', colors),
+        'drivers-points': lambda: chart('drivers-points', 'full_name', 'points', 'Most points'),
+        'teams-points': lambda: chart('teams-points', 'constructor', 'points', 'Most points by constructor', colors),
+    }
+    charts = {}
+    for name, build in builders.items():
+        path = os.path.join(SNAPSHOT_DIR, version, f'racechart-{name}-{RACECHART_FORMAT}-{top}.json')
+        try:
+            with open(path, 'rb') as f:
+                charts[name] = f.read()
+            continue
+        except OSError:
+            pass
+        charts[name] = build()
+        try:
+            tmp = f'{path}.{os.getpid()}'
+            with open(tmp, 'wb') as f:
+                f.write(charts[name])
+            os.replace(tmp, path)
+        except OSError:
+            pass
+    return charts
+
+######################################################Flask#############################################################
+
+def register(server, current):
+    #the charts are ~400 KB of json each, too much to re-encode with the dash layout on every page load; the browser
+    #fetches them once per dataset version (assets/racechart.js). current() returns (charts, version) of the dataset
+    #being served
+    @server.route('/racecharts/<name>.json')
+    def race_chart(name):
+        charts, version = current()
+        if name not in charts:
+            flask.abort(404)
+        response = flask.Response(charts[name], mimetype='application/json')
+        response.set_etag(f'{version}-{RACECHART_FORMAT}-{name}')
+        response.cache_control.public = True
+        response.cache_control.max_age = 3600
+        return response.make_conditional(flask.request)
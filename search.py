@@ -0,0 +1,113 @@
+import unicodedata
+from collections import defaultdict
+
+import flask
+
+######################################################Index#############################################################
+
+def fold(text):
+    #lowercase without accents, so 'raikkonen' finds 'Räikkönen'
+    return ''.join(c for c in unicodedata.normalize('NFKD', str(text)) if not unicodedata.combining(c)).lower()
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class DriverSearch:
+    #every driver in history by full name, surname and code: a prefix table for search-as-you-type and a trigram
+    #table for typos and substrings, both built once at startup
+
+    def __init__(self, f1_data, touched=None, previous=None):
+        #with the index of the snapshot before (`previous`) only the drivers in `touched` are looked up again; the
+        #others keep their entry and their place in the tables
+        if previous is not None:
+            f1_data = f1_data[f1_data['full_name'].isin(list(touched))]
+        drivers = f1_data.groupby('full_name', observed=True).agg(
+            code=('code', 'last'), surname=('surname', 'last'),
+            first_year=('year', 'min'), last_year=('year', 'max'), races=('year', 'size'))
+        self.drivers = [] if previous is None else list(previous.drivers)
+        self.prefixes = defaultdict(set) if previous is None else defaultdict(frozenset, previous.prefixes)
+        self.trigrams = defaultdict(set) if previous is None else defaultdict(frozenset, previous.trigrams)
+        known = {driver['name']: i for i, driver in enumerate(self.drivers)}
+        for name, code, surname, first_year, last_year, races in drivers.itertuples():
+            code = '' if str(code) == '\\N' else str(code)
+            driver = {
+                'name': name, 'code': code, 'first_year': int(first_year), 'last_year': int(last_year), 'races': int(races),
+                'folded': fold(name), 'surname': fold(surname), 'code_folded': fold(code),
+            }
+            if name in known:
+                #the sets carried over are shared with the previous index, so they are replaced rather than changed
+                i = known[name]
+                old_prefixes, old_trigrams = self.keys(self.drivers[i])
+                new_prefixes, new_trigrams = self.keys(driver)
+                for table, old, new in ((self.prefixes, old_prefixes, new_prefixes), (self.trigrams, old_trigrams, new_trigrams)):
+                    for key in old - new:
+                        table[key] = table[key] - {i}
+                    for key in new - old:
+                        table[key] = table[key] | {i}
+                self.drivers[i] = driver
+                continue
+            i = len(self.drivers)
+            self.drivers.append(driver)
+            prefixes, grams = self.keys(driver)
+            for table, keys in ((self.prefixes, prefixes), (self.trigrams, grams)):
+                for key in keys:
+                    if previous is None:
+                        table[key].add(i)
+                    else:
+                        table[key] = table[key] | {i}
+
+    @staticmethod
+    def keys(driver):
+        #prefix and trigram table keys of one driver
+        prefixes = set()
+        for token in set(driver['folded'].split()) | ({driver['code_folded']} - {''}):
+            prefixes.update(token[:k] for k in range(1, len(token) + 1))
+        return prefixes, trigrams(driver['folded'])
+
+    def rank(self, i, query):
+        #higher is better: exact name, exact code, surname prefix, any word prefix; then the longest careers
+        driver = self.drivers[i]
+        exact = driver['folded'] == query
+        code = driver['code_folded'] == query
+        surname = driver['surname'].startswith(query)
+        return (-exact, -code, -surname, -driver['races'], driver['name'])
+
+    def search(self, query, page=0, size=10):
+        query = ' '.join(fold(query).split())
+        if not query:
+            return {'query': query, 'total': 0, 'page': page, 'results': []}
+        #every word of the query has to start a word of the name (or be the start of the code)
+        found = None
+        for token in query.split():
+            matches = self.prefixes.get(token, set())
+            found = matches if found is None else found & matches
+        ranked = sorted(found, key=lambda i: self.rank(i, query))
+
+        #not enough: names sharing at least half of the query's trigrams, most shared first
+        if len(ranked) < (page + 1) * size:
+            grams = trigrams(query)
+            shared = defaultdict(int)
+            for gram in grams:
+                for i in self.trigrams.get(gram, ()):
+                    shared[i] += 1
+            extra = [i for i, n in shared.items() if n * 2 >= len(grams) and i not in found]
+            ranked += sorted(extra, key=lambda i: (-shared[i], -self.drivers[i]['races'], self.drivers[i]['name']))
+
+        results = [{k: self.drivers[i][k] for k in ('name', 'code', 'first_year', 'last_year', 'races')}
+                   for i in ranked[page * size:(page + 1) * size]]
+        return {'query': query, 'total': len(ranked), 'page': page, 'results': results}
+
+######################################################Flask#############################################################
+
+def register(server, current):
+    #/search/drivers?q=senna&page=0&size=10, current() returns the index of the dataset being served
+    @server.route('/search/drivers')
+    def search_drivers():
+        args = flask.request.args
+        try:
+            page = max(int(args.get('page', 0)), 0)
+            size = min(max(int(args.get('size', 10)), 1), 50)
+        except ValueError:
+            flask.abort(400)
+        return flask.jsonify(current().search(args.get('q', '')[:100], page, size))
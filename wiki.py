@@ -0,0 +1,98 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import requests
+
+from cache import TTLCache
+
+######################################################Settings##########################################################
+
+#point WIKI_API at a local stub server to run without the network
+WIKI_API = os.environ.get('WIKI_API', 'https://en.wikipedia.org/w/api.php')
+WIKI_CACHE_DIR = os.environ.get('WIKI_CACHE_DIR', 'wiki_cache')
+WIKI_CACHE_TTL = float(os.environ.get('WIKI_CACHE_TTL', 7 * 24 * 3600))
+#socket timeout of one api call, and the longest a callback waits for an answer before showing the placeholder
+WIKI_TIMEOUT = float(os.environ.get('WIKI_TIMEOUT', 3))
+WIKI_DEADLINE = float(os.environ.get('WIKI_DEADLINE', 1.5))
+
+######################################################Cache#############################################################
+
+cache = TTLCache(WIKI_CACHE_DIR, WIKI_CACHE_TTL)
+
+#pages whose wikipedia lead image is not the track map, or whose title is ambiguous
+cache.seed('circuit_image:Eifel Grand Prix', 'https://upload.wikimedia.org/wikipedia/commons/thumb/7/76/N%C3%BCrburgring_-_Grand-Prix-Strecke.svg/600px-N%C3%BCrburgring_-_Grand-Prix-Strecke.svg.png')
+cache.seed('circuit_image:Tuscan Grand Prix', 'https://upload.wikimedia.org/wikipedia/commons/thumb/3/38/Mugello_Racing_Circuit_track_map_15_turns.svg/600px-Mugello_Racing_Circuit_track_map_15_turns.svg.png')
+cache.seed('circuit_image:Styrian Grand Prix', 'https://upload.wikimedia.org/wikipedia/commons/thumb/b/b2/Circuit_Red_Bull_Ring.svg/600px-Circuit_Red_Bull_Ring.svg.png')
+cache.seed('driver_photo:George Russell', 'https://upload.wikimedia.org/wikipedia/commons/thumb/3/36/2019_Formula_One_tests_Barcelona%2C_Russell_%2833376134568%29.jpg/226px-2019_Formula_One_tests_Barcelona%2C_Russell_%2833376134568%29.jpg')
+
+title_overrides = {
+    'George Russell': 'George Russell (racing driver)',
+}
+
+######################################################Lookups###########################################################
+
+#one keep-alive session and one pool shared by every callback in the process
+session = requests.Session()
+session.headers['User-Agent'] = 'F1-Dash (https://github.com/Gcardoso233/F1-Dash)'
+session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8))
+session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8))
+pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='wiki')
+
+inflight = {}
+inflight_lock = threading.Lock()
+
+def query(**params):
+    response = session.get(WIKI_API, params=dict(action='query', format='json', formatversion=2, **params), timeout=WIKI_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+def page(title, size, summary=False):
+    #thumbnail and (optionally) intro text of one page in a single api call
+    prop = 'pageimages|extracts' if summary else 'pageimages'
+    params = dict(prop=prop, piprop='thumbnail', pithumbsize=size, redirects=1, titles=title)
+    if summary:
+        params.update(exintro='', explaintext='')
+    data = query(**params)['query']['pages'][0]
+    return {'thumbnail': data.get('thumbnail', {}).get('source'), 'extract': data.get('extract')}
+
+def resolve(key, fetch):
+    #cache hits are read on the calling thread, so they never queue behind slow fetches. misses and expired entries
+    #go to the shared pool with a hard deadline; concurrent callers for the same key share one fetch, an answer that
+    #arrives late still lands in the cache for the next request, and an expired entry is served stale meanwhile
+    value, fresh = cache.peek(key)
+    if fresh:
+        return value
+    with inflight_lock:
+        future = inflight.get(key)
+        created = future is None
+        if created:
+            future = pool.submit(cache.get, key, fetch)
+            inflight[key] = future
+    if created:
+        future.add_done_callback(lambda done: forget(key, done))
+    try:
+        return future.result(timeout=WIKI_DEADLINE)
+    except TimeoutError:
+        cache.count('timeouts')
+        if value is not None:
+            cache.count('stale')
+        return value
+
+def forget(key, future):
+    with inflight_lock:
+        if inflight.get(key) is future:
+            del inflight[key]
+
+def circuit_image(gp):
+    if f'circuit_image:{gp}' in cache.overrides:
+        return cache.get(f'circuit_image:{gp}', None)
+    found = resolve(f'circuit_page:{gp}', lambda: page(gp, 600))
+    return found and found['thumbnail']
+
+def driver_media(name):
+    #(photo url, summary text), either can be None when wikipedia has nothing or did not answer in time
+    found = resolve(f'driver_page:{name}', lambda: page(title_overrides.get(name, name), 500, summary=True)) or {}
+    if f'driver_photo:{name}' in cache.overrides:
+        return cache.get(f'driver_photo:{name}', None), found.get('extract')
+    return found.get('thumbnail'), found.get('extract')
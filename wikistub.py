@@ -0,0 +1,57 @@
+import argparse
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+#a stand-in for the wikipedia api used by wiki.py, for benchmarks and load tests: answers every query with a
+#made-up thumbnail and intro after an optional delay. point the app at it with WIKI_API=<url>
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    #headers and body go out in separate writes; without this keep-alive clients wait on delayed acks
+    disable_nagle_algorithm = True
+    delay = 0.0
+
+    def do_GET(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query, keep_blank_values=True)
+        title = query.get('titles', [''])[0]
+        prop = query.get('prop', [''])[0]
+        page = {'title': title}
+        if 'pageimages' in prop:
+            page['thumbnail'] = {'source': f'https://upload.wikimedia.org/stub/{urllib.parse.quote(title)}.png'}
+        if 'extracts' in prop:
+            page['extract'] = f'{title} is a stub page. It exists for testing. It has sentences. Five of them are shown. This is the fifth. This one is cut.'
+        if self.delay:
+            time.sleep(self.delay)
+        body = json.dumps({'query': {'pages': [page]}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start(port=0, delay=0.0):
+    #serve on a background thread; returns (server, api url)
+    handler = type('Handler', (StubHandler,), {'delay': delay})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/w/api.php'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the Wikipedia API')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds to wait before every answer')
+    args = parser.parse_args()
+
+    server, url = start(args.port, args.delay)
+    print(f'WIKI_API={url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()